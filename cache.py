@@ -0,0 +1,78 @@
+import json
+import time
+import sqlite3
+import threading
+
+CACHE_DB = 'cache.sqlite'
+
+
+class SqliteCache:
+    """
+    Small persistent key/value cache backed by SQLite in the working directory.
+    Every entry carries its own expiry, and values read or written in this process
+    are also memoised in memory so repeat lookups never touch the database.
+    Expired entries of the namespace are evicted on open once they are `stale_window`
+    seconds past their expiry, so get_entry can serve them stale until then.
+    """
+
+    def __init__(self, namespace: str, ttl: float, path: str = CACHE_DB, stale_window: float = 0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.path = path
+        self.stale_window = stale_window
+        self._memo = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, stored_at REAL, expires_at REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at < ?",
+                               (namespace, time.time() - stale_window))
+
+    def get(self, key: str):
+        """Return the cached value, or None if missing or expired"""
+        entry = self.get_entry(key)
+        if entry is None or entry[2] < time.time():
+            return None
+        return entry[0]
+
+    def get_entry(self, key: str):
+        """Return (value, stored_at, expires_at) even if expired, or None if missing"""
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+            row = self._conn.execute(
+                "SELECT value, stored_at, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = (json.loads(row[0]), row[1], row[2])
+            self._memo[key] = entry
+            return entry
+
+    def set(self, key: str, value, ttl: float = None):
+        now = time.time()
+        entry = (value, now, now + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            self._memo[key] = entry
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), entry[1], entry[2])
+                )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._memo.pop(key, None)
+            with self._conn:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
@@ -1,43 +1,72 @@
+import io
 import os
 import re
-import winreg
+import sys
+import json
+import time
+import shutil
 import zipfile
+import platform
 import requests
 import subprocess
 from typing import Callable, Optional
 
+if sys.platform == "win32":
+    import winreg
+else:
+    winreg = None
+
+CACHE_FILE = "chromedriver_cache.json"
+MILESTONES_URL = "https://googlechromelabs.github.io/chrome-for-testing/latest-versions-per-milestone.json"
+DOWNLOAD_URL = "https://edgedl.me.gvt1.com/edgedl/chrome/chrome-for-testing/{version}/{platform}/chromedriver-{platform}.zip"
+
+# Result of the last successful check in this process: (chrome_version, chromedriver_path)
+_last_check = None
+
 
 def update_chromedriver(log_callback: Optional[Callable[[str], None]] = print):
     """
     One-click function to update ChromeDriver to match your installed Chrome version.
     Only downloads new version if there's a mismatch.
-    Returns the path to chromedriver.exe for immediate use with Selenium.
+    Returns the path to the chromedriver binary for immediate use with Selenium.
+    Results are cached in-process and in chromedriver_cache.json, so repeat checks
+    skip the subprocess calls while neither Chrome nor chromedriver changed.
     """
+    global _last_check
     try:
+        cache = _load_cache()
         log_callback("🔍 Checking Chrome version...")
-        chrome_version = _get_chrome_version(log_callback)
+        chrome_version = _get_chrome_version(log_callback, cache)
         log_callback(f"✅ Installed Chrome version: {chrome_version}")
 
         major_version = _get_major_version(chrome_version)
         log_callback(f"✅ Chrome major version: {major_version}")
 
         # Check if we already have a compatible chromedriver
-        chromedriver_path = os.path.join(os.getcwd(), "chromedriver.exe")
-        if _is_chromedriver_compatible(chromedriver_path, major_version, log_callback):
+        chromedriver_path = os.path.abspath(_chromedriver_name())
+        if _last_check == (chrome_version, chromedriver_path) and os.path.exists(chromedriver_path):
+            log_callback("✅ ChromeDriver is already up-to-date!")
+            return chromedriver_path
+        if _is_chromedriver_compatible(chromedriver_path, major_version, log_callback, cache):
             log_callback("✅ ChromeDriver is already up-to-date!")
+            _last_check = (chrome_version, chromedriver_path)
+            _save_cache(cache)
             return chromedriver_path
 
-        chromedriver_version = _get_chromedriver_version(major_version)
+        chromedriver_version = _get_chromedriver_version(major_version, cache)
         log_callback(f"🔄 Corresponding ChromeDriver version: {chromedriver_version}")
 
-        chromedriver_path = _download_chromedriver(chromedriver_version, log_callback)
-        log_callback(f"✅ ChromeDriver installed at: {os.path.abspath(chromedriver_path)}")
+        chromedriver_path = os.path.abspath(_download_chromedriver(chromedriver_version, log_callback=log_callback))
+        log_callback(f"✅ ChromeDriver installed at: {chromedriver_path}")
 
         # Verify installation
         if os.path.exists(chromedriver_path):
             result = subprocess.run([chromedriver_path, '--version'], capture_output=True, text=True, check=False)
             log_callback(f"✅ Verification: {result.stdout.strip()}")
 
+        cache.pop("chromedriver", None)
+        _save_cache(cache)
+        _last_check = (chrome_version, chromedriver_path)
         log_callback("🎉 ChromeDriver update completed successfully!")
         return chromedriver_path
 
@@ -50,8 +79,46 @@ def update_chromedriver(log_callback: Optional[Callable[[str], None]] = print):
         raise
 
 
+def _load_cache() -> dict:
+    try:
+        with open(CACHE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache: dict):
+    try:
+        tmp_path = CACHE_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, CACHE_FILE)
+    except OSError:
+        pass
+
+
+def _file_signature(path: str) -> list:
+    """Size and mtime, enough to notice a binary was replaced"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def _platform_name() -> str:
+    """chrome-for-testing platform name for this machine"""
+    if sys.platform == "win32":
+        return "win64" if platform.machine().endswith("64") else "win32"
+    if sys.platform == "darwin":
+        return "mac-arm64" if platform.machine() == "arm64" else "mac-x64"
+    return "linux64"
+
+
+def _chromedriver_name() -> str:
+    return "chromedriver.exe" if sys.platform == "win32" else "chromedriver"
+
+
 def _is_chromedriver_compatible(chromedriver_path: str, expected_major_version: str,
-                               log_callback: Optional[Callable[[str], None]] = print) -> bool:
+                                log_callback: Optional[Callable[[str], None]] = print,
+                                cache: Optional[dict] = None) -> bool:
     """
     Check if existing ChromeDriver is compatible with current Chrome version
     """
@@ -60,21 +127,29 @@ def _is_chromedriver_compatible(chromedriver_path: str, expected_major_version:
         return False
 
     try:
-        # Get current chromedriver version
-        result = subprocess.run([chromedriver_path, '--version'], capture_output=True, text=True, check=False)
-        if result.returncode != 0:
-            log_callback("⚠️  Existing ChromeDriver is corrupted, will reinstall...")
-            return False
+        cached = (cache or {}).get("chromedriver", {})
+        if cached.get("path") == chromedriver_path and cached.get("signature") == _file_signature(chromedriver_path):
+            current_chromedriver_version = cached["version"]
+        else:
+            # Get current chromedriver version
+            result = subprocess.run([chromedriver_path, '--version'], capture_output=True, text=True, check=False)
+            if result.returncode != 0:
+                log_callback("⚠️  Existing ChromeDriver is corrupted, will reinstall...")
+                return False
 
-        # Extract version from output
-        version_output = result.stdout.strip()
-        version_match = re.search(r'ChromeDriver\s+(\d+\.\d+\.\d+\.\d+)', version_output)
+            # Extract version from output
+            version_output = result.stdout.strip()
+            version_match = re.search(r'ChromeDriver\s+(\d+\.\d+\.\d+\.\d+)', version_output)
 
-        if not version_match:
-            log_callback("⚠️  Could not parse ChromeDriver version, will reinstall...")
-            return False
+            if not version_match:
+                log_callback("⚠️  Could not parse ChromeDriver version, will reinstall...")
+                return False
+
+            current_chromedriver_version = version_match.group(1)
+            if cache is not None:
+                cache["chromedriver"] = {"path": chromedriver_path, "version": current_chromedriver_version,
+                                         "signature": _file_signature(chromedriver_path)}
 
-        current_chromedriver_version = version_match.group(1)
         current_major = _get_major_version(current_chromedriver_version)
 
         if current_major == expected_major_version:
@@ -84,60 +159,83 @@ def _is_chromedriver_compatible(chromedriver_path: str, expected_major_version:
             log_callback(f"🔄 ChromeDriver version mismatch: {current_major} (current) vs {expected_major_version} (required)")
             return False
 
-    except (OSError, subprocess.SubprocessError, ValueError) as e:
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError) as e:
         log_callback(f"⚠️  Error checking ChromeDriver compatibility: {e}, will reinstall...")
         return False
 
 
-def _get_chrome_version(log_callback: Optional[Callable[[str], None]] = print) -> str:
-    """Get the installed Chrome version using multiple fallback methods"""
-
-    # Method 1: Try common Chrome installation paths
-    chrome_paths = [
-        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-        os.path.expanduser(r"~\AppData\Local\Google\Chrome\Application\chrome.exe")
-    ]
-
-    chrome_exe = None
-    for path in chrome_paths:
-        if os.path.exists(path):
-            chrome_exe = path
-            break
+def _find_chrome() -> Optional[str]:
+    """Locate the Chrome executable on Windows, macOS or Linux"""
+    if sys.platform == "win32":
+        # Method 1: Try common Chrome installation paths
+        chrome_paths = [
+            r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+            r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+            os.path.expanduser(r"~\AppData\Local\Google\Chrome\Application\chrome.exe")
+        ]
+        for path in chrome_paths:
+            if os.path.exists(path):
+                return path
 
-    if not chrome_exe:
         # Method 2: Try to find Chrome in registry
-        try:
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
-                                r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe") as key:
-                chrome_exe, _ = winreg.QueryValueEx(key, "")
-        except (OSError, FileNotFoundError):
+        for key_path in (r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe",
+                         r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe"):
             try:
-                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
-                                    r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe") as key:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path) as key:
                     chrome_exe, _ = winreg.QueryValueEx(key, "")
+                    return chrome_exe
             except (OSError, FileNotFoundError):
                 pass
+        return None
+
+    if sys.platform == "darwin":
+        path = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+        return path if os.path.exists(path) else None
+
+    for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser"):
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+
+def _get_chrome_version(log_callback: Optional[Callable[[str], None]] = print, cache: Optional[dict] = None) -> str:
+    """Get the installed Chrome version using multiple fallback methods"""
+    chrome_exe = _find_chrome()
 
     if not chrome_exe or not os.path.exists(chrome_exe):
         raise FileNotFoundError("Chrome not found. Please make sure Chrome is installed.")
 
     log_callback(f"✅ Chrome found at: {chrome_exe}")
 
-    # Method 3: Get version using PowerShell (most reliable)
-    try:
-        cmd = f'(Get-Item "{chrome_exe}").VersionInfo.FileVersion'
-        result = subprocess.run(
-            ['powershell', '-Command', cmd],
-            capture_output=True, text=True, check=False
-        )
-        version = result.stdout.strip()
-        if version:
-            return version
-    except subprocess.SubprocessError:
-        pass
+    # Reuse the cached version while the Chrome binary is unchanged
+    signature = _file_signature(chrome_exe)
+    cached = (cache or {}).get("chrome", {})
+    if cached.get("path") == chrome_exe and cached.get("signature") == signature:
+        return cached["version"]
+
+    version = _query_chrome_version(chrome_exe)
+    if cache is not None:
+        cache["chrome"] = {"path": chrome_exe, "signature": signature, "version": version}
+    return version
+
 
-    # Method 4: Try to extract version from chrome.exe directly
+def _query_chrome_version(chrome_exe: str) -> str:
+    if sys.platform == "win32":
+        # Method 3: Get version using PowerShell (most reliable)
+        try:
+            cmd = f'(Get-Item "{chrome_exe}").VersionInfo.FileVersion'
+            result = subprocess.run(
+                ['powershell', '-Command', cmd],
+                capture_output=True, text=True, check=False
+            )
+            version = result.stdout.strip()
+            if version:
+                return version
+        except (OSError, subprocess.SubprocessError):
+            pass
+
+    # Method 4: Try to extract version from the Chrome binary directly
     try:
         result = subprocess.run(
             [chrome_exe, '--version'],
@@ -146,16 +244,17 @@ def _get_chrome_version(log_callback: Optional[Callable[[str], None]] = print) -
         version_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', result.stdout)
         if version_match:
             return version_match.group(1)
-    except subprocess.SubprocessError:
+    except (OSError, subprocess.SubprocessError):
         pass
 
     # Method 5: Try registry version
-    try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Google\Chrome\BLBeacon") as key:
-            version, _ = winreg.QueryValueEx(key, "version")
-            return version
-    except (OSError, FileNotFoundError):
-        pass
+    if winreg is not None:
+        try:
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Google\Chrome\BLBeacon") as key:
+                version, _ = winreg.QueryValueEx(key, "version")
+                return version
+        except (OSError, FileNotFoundError):
+            pass
 
     raise RuntimeError("Could not determine Chrome version")
 
@@ -168,80 +267,71 @@ def _get_major_version(full_version: str) -> str:
     raise ValueError(f"Could not extract major version from: {full_version}")
 
 
-def _get_chromedriver_version(major_version: str) -> str:
-    """Get the latest ChromeDriver version for the given major Chrome version"""
-    try:
-        # Get the latest version information from ChromeDriver download page
-        url = "https://googlechromelabs.github.io/chrome-for-testing/known-good-versions.json"
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-
-        data = response.json()
-
-        # Find versions matching our major version
-        matching_versions = []
-        for version_info in data['versions']:
-            if version_info['version'].startswith(f"{major_version}."):
-                matching_versions.append(version_info['version'])
-
-        if not matching_versions:
-            raise ValueError(f"No ChromeDriver found for Chrome major version {major_version}")
-
-        # Return the latest matching version (last in sorted list)
-        latest_version = sorted(matching_versions)[-1]
-        return latest_version
+def _get_chromedriver_version(major_version: str, cache: Optional[dict] = None) -> str:
+    """
+    Get the latest ChromeDriver version for the given major Chrome version.
+    Uses the small per-milestone manifest, fetched conditionally (ETag / Last-Modified)
+    and kept in the cache so an unchanged manifest costs a 304.
+    """
+    cache = cache if cache is not None else {}
+    cached = cache.get("milestones", {})
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
 
+    try:
+        response = requests.get(MILESTONES_URL, headers=headers, timeout=30)
+        if response.status_code == 304 and "data" in cached:
+            data = cached["data"]
+        else:
+            response.raise_for_status()
+            data = response.json()
+            cache["milestones"] = {"etag": response.headers.get("ETag"),
+                                   "last_modified": response.headers.get("Last-Modified"),
+                                   "fetched_at": time.time(), "data": data}
+            _save_cache(cache)
     except requests.RequestException as e:
-        raise RuntimeError(f"Failed to fetch ChromeDriver version information: {e}")
+        if "data" not in cached:
+            raise RuntimeError(f"Failed to fetch ChromeDriver version information: {e}")
+        data = cached["data"]
+
+    milestone = data.get("milestones", {}).get(str(major_version))
+    if not milestone:
+        raise ValueError(f"No ChromeDriver found for Chrome major version {major_version}")
+    return milestone["version"]
 
 
 def _download_chromedriver(version: str, install_dir: str = ".",
-                          log_callback: Optional[Callable[[str], None]] = print) -> str:
-    """Download and extract ChromeDriver"""
-    download_url = f"https://edgedl.me.gvt1.com/edgedl/chrome/chrome-for-testing/{version}/win64/chromedriver-win64.zip"
+                           log_callback: Optional[Callable[[str], None]] = print) -> str:
+    """Download ChromeDriver and stream the binary straight out of the zip, no temp files"""
+    platform_name = _platform_name()
+    download_url = DOWNLOAD_URL.format(version=version, platform=platform_name)
+    binary_name = _chromedriver_name()
+    final_chromedriver_path = os.path.join(install_dir, binary_name)
 
     try:
-        log_callback(f"📥 Downloading ChromeDriver {version}...")
-        response = requests.get(download_url, stream=True, timeout=60)
+        log_callback(f"📥 Downloading ChromeDriver {version} ({platform_name})...")
+        response = requests.get(download_url, timeout=60)
         response.raise_for_status()
 
-        zip_path = os.path.join(install_dir, "chromedriver.zip")
-        with open(zip_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-
         log_callback("📦 Extracting ChromeDriver...")
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(install_dir)
-
-        # Clean up
-        os.remove(zip_path)
-
-        # Move chromedriver to install directory
-        extracted_dir = os.path.join(install_dir, "chromedriver-win64")
-        chromedriver_exe = os.path.join(extracted_dir, "chromedriver.exe")
-        final_chromedriver_path = os.path.join(install_dir, "chromedriver.exe")
-
-        if os.path.exists(extracted_dir):
-            if os.path.exists(final_chromedriver_path):
-                os.remove(final_chromedriver_path)
-            os.rename(chromedriver_exe, final_chromedriver_path)
-
-            # Clean up empty directory
-            try:
-                os.rmdir(extracted_dir)
-            except OSError:
-                # Directory might not be empty, remove remaining files
-                for file in os.listdir(extracted_dir):
-                    file_path = os.path.join(extracted_dir, file)
-                    if os.path.isfile(file_path):
-                        os.remove(file_path)
-                os.rmdir(extracted_dir)
-
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zip_ref:
+            member = next((name for name in zip_ref.namelist() if name.endswith("/" + binary_name)), None)
+            if member is None:
+                raise RuntimeError(f"{binary_name} not found in the downloaded archive")
+
+            tmp_path = final_chromedriver_path + ".new"
+            with zip_ref.open(member) as source, open(tmp_path, "wb") as target:
+                shutil.copyfileobj(source, target)
+
+        if sys.platform != "win32":
+            os.chmod(tmp_path, 0o755)
+        os.replace(tmp_path, final_chromedriver_path)
         return final_chromedriver_path
 
     except requests.RequestException as e:
         raise RuntimeError(f"Failed to download ChromeDriver: {e}")
     except zipfile.BadZipFile:
-        raise RuntimeError("Downloaded file is not a valid ZIP file")
\ No newline at end of file
+        raise RuntimeError("Downloaded file is not a valid ZIP file")
@@ -0,0 +1,193 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from driver_pool import configure as configure_driver_pool, shutdown_pools
+from downloader import DownloadJob, find_drive_links
+from job_queue import JobQueue, JobScheduler
+from content_store import get_store
+from post_processing import PostProcessor, resolve_steps, DEFAULT_STEPS
+from telemetry import get_telemetry
+from tracing import span, enable as enable_tracing, export_chrome_trace, format_summary
+from google_drive import authenticate_drive_api, configure_limits, SEGMENT_THRESHOLD
+from helper_functions import read_settings, get_int_setting
+
+_print_lock = threading.Lock()
+_failed_queries = set()  # queries whose "done" event reported failed or error, for the exit status
+
+
+def emit(event, query, **fields):
+    """Write one JSON-lines progress record to stdout"""
+    record = {"time": round(time.time(), 3), "event": event, "query": query, **fields}
+    line = json.dumps(record, ensure_ascii=False)
+    with _print_lock:
+        if event == "done":
+            if fields.get("status") in ("failed", "error"):
+                _failed_queries.add(query)
+            else:
+                _failed_queries.discard(query)
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def read_queries(path):
+    """One query per line: anime name (optionally with -m), Drive link or folder id"""
+    with (sys.stdin if path == "-" else open(path, "r", encoding="utf-8")) as file:
+        return [line.strip() for line in file if line.strip() and not line.strip().startswith("#")]
+
+
+def run_query(service, query, args):
+    """Scrape and download one query, returning the per-file results"""
+    with span("job", query=query):
+        return _run_query(service, query, args)
+
+
+def _run_query(service, query, args):
+    emit("start", query)
+    drive_links = find_drive_links(query, headless_browser=True, refresh=args.refresh_search)
+    if not drive_links:
+        emit("done", query, status="no_links", files=0)
+        return []
+    for name, url in drive_links:
+        emit("link", query, name=name, url=url)
+
+    job = DownloadJob(service, drive_links, query, args.downloads, args.segments, args.segment_threshold_mb * 1024 * 1024,
+                      on_text=lambda text: emit("log", query, message=text),
+                      on_progress=lambda percent: emit("progress", query, percent=percent),
+                      content_store=get_store() if args.content_store else None,
+                      post_processor=args.post_processor,
+                      sequential=args.sequential, stream_server=args.stream_server)
+    results = job.run()
+    for result in results:
+        emit("file", query, **result)
+    failed = sum(1 for result in results if result["status"] == "failed")
+    emit("done", query, status="failed" if failed else "ok", files=len(results), failed=failed)
+    return results
+
+
+def process_query(service, query, args):
+    try:
+        run_query(service, query, args)
+    except Exception as e:
+        emit("done", query, status="error", error=str(e))
+
+
+def run_queued_query(service, query, args):
+    """run_query for the job scheduler: errors are reported, then re-raised so the attempt counts as failed"""
+    try:
+        return run_query(service, query, args)
+    except Exception as e:
+        emit("done", query, status="error", error=str(e))
+        raise
+
+
+def main(argv=None):
+    settings = read_settings()
+    parser = argparse.ArgumentParser(description="Download anime from Google Drive without the GUI.")
+    parser.add_argument("input", nargs="?", help="file with one anime name / Drive link / folder id per line, '-' for stdin")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="add the queries to the persistent job queue instead of running them")
+    parser.add_argument("--priority", type=int, default=0, help="priority of queued jobs, higher runs first")
+    parser.add_argument("--drain", action="store_true",
+                        help="run every queued job (including unfinished ones) until the queue is empty")
+    parser.add_argument("--refresh-search", action="store_true",
+                        help="scrape kayoanime again instead of using cached search results")
+    parser.add_argument("--clear-search-cache", action="store_true",
+                        help="forget every cached kayoanime search result")
+    parser.add_argument("-p", "--parallel", type=int, default=2, help="titles processed at the same time")
+    parser.add_argument("-d", "--downloads", type=int,
+                        default=get_int_setting(settings, "max_concurrent_downloads", 3),
+                        help="concurrent file downloads per title")
+    parser.add_argument("--segments", type=int, default=get_int_setting(settings, "download_segments", 4),
+                        help="connections per large file")
+    parser.add_argument("--segment-threshold-mb", type=int,
+                        default=get_int_setting(settings, "segment_threshold_mb", SEGMENT_THRESHOLD // (1024 * 1024)),
+                        help="files at least this large are downloaded in segments")
+    parser.add_argument("--content-store", action=argparse.BooleanOptionalAction,
+                        default=settings.get("content_store") == "1",
+                        help="hardlink repeat content from downloads/.store instead of downloading it again")
+    parser.add_argument("--post-processing-steps", default=settings.get("post_processing_steps", DEFAULT_STEPS),
+                        help="comma separated steps run on finished files, empty to disable")
+    parser.add_argument("--sequential", action=argparse.BooleanOptionalAction,
+                        default=settings.get("sequential_downloads") == "1",
+                        help="download the lowest episode first, front to back, and serve it for playback while downloading")
+    parser.add_argument("--stream-port", type=int, default=get_int_setting(settings, "stream_port", 8765),
+                        help="port of the local play-while-downloading server used with --sequential")
+    parser.add_argument("--telemetry-file", default=settings.get("telemetry_file") or None,
+                        help="append a JSON-lines transfer snapshot (bytes, throughput, ETA) to this file periodically")
+    parser.add_argument("--telemetry-interval", type=int, default=get_int_setting(settings, "telemetry_interval", 5),
+                        help="seconds between telemetry snapshots")
+    parser.add_argument("--trace", nargs="?", const="trace.json",
+                        default=(settings.get("trace_file") or "trace.json") if settings.get("tracing") == "1" else None,
+                        help="record phase timings, write them as Chrome trace-event JSON to this file "
+                             "(default trace.json) and print a summary table to stderr")
+    parser.add_argument("--requests-per-second", type=int,
+                        default=get_int_setting(settings, "drive_requests_per_second", 10),
+                        help="global Drive API request rate")
+    parser.add_argument("--max-download-kbps", type=int, default=get_int_setting(settings, "max_download_kbps", 0),
+                        help="global download bandwidth cap in KiB/s, 0 for unlimited")
+    parser.add_argument("--http-pool-size", type=int, default=get_int_setting(settings, "http_pool_size", 16),
+                        help="keep-alive connections shared by all Drive requests")
+    args = parser.parse_args(argv)
+    if args.clear_search_cache:
+        from web_scraping import invalidate_search_cache
+        invalidate_search_cache()
+        emit("search_cache_cleared", None)
+        if not args.input and not args.drain:
+            return
+    if not args.input and not args.drain:
+        parser.error("an input file is required unless --drain is given")
+
+    queries = read_queries(args.input) if args.input else []
+    if args.enqueue:
+        job_queue = JobQueue()
+        for query in queries:
+            emit("queued", query, job_id=job_queue.enqueue(query, args.priority))
+        return
+
+    try:
+        args.post_processor = PostProcessor(resolve_steps(args.post_processing_steps),
+                                            log=lambda text: emit("log", None, message=text))
+    except ValueError as e:
+        parser.error(str(e))
+    enable_tracing(bool(args.trace))
+    if args.telemetry_file:
+        get_telemetry().start_export(args.telemetry_file, args.telemetry_interval)
+    args.stream_server = None
+    if args.sequential:
+        from stream_server import StreamServer
+
+        args.stream_server = StreamServer(port=args.stream_port, log=lambda text: emit("log", None, message=text))
+        args.stream_server.start()
+    configure_limits(args.requests_per_second, args.max_download_kbps * 1024)
+    configure_driver_pool(max(args.parallel, get_int_setting(settings, "webdriver_pool_size", 2)))
+    service = authenticate_drive_api(interactive=False, pool_size=args.http_pool_size)
+
+    try:
+        if args.drain:
+            job_queue = JobQueue()
+            for query in queries:
+                job_queue.enqueue(query, args.priority)
+            scheduler = JobScheduler(job_queue, lambda job_id, query: run_queued_query(service, query, args), args.parallel,
+                                     log=lambda text: emit("log", None, message=text))
+            scheduler.run(until_empty=True)
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+                for query in queries:
+                    executor.submit(process_query, service, query, args)
+    finally:
+        args.post_processor.shutdown()
+        if args.stream_server:
+            args.stream_server.stop()
+        shutdown_pools()
+        if args.trace:
+            export_chrome_trace(args.trace)
+            sys.stderr.write(format_summary() + "\n")
+    return 1 if _failed_queries else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
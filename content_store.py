@@ -0,0 +1,71 @@
+import os
+import shutil
+import threading
+
+STORE_PATH = os.path.join("downloads", ".store")
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class ContentStore:
+    """
+    Content-addressed store of downloaded files under downloads/.store/<md5[:2]>/<md5>.
+    Every verified download is hardlinked into the store, so a later job that needs the
+    same content (another title, a "complete" folder, a special that is also a movie)
+    gets a hardlink instead of downloading it again.
+    """
+
+    def __init__(self, root=STORE_PATH):
+        self.root = root
+
+    def path_for(self, md5):
+        return os.path.join(self.root, md5[:2], md5)
+
+    def contains(self, md5):
+        return bool(md5) and os.path.exists(self.path_for(md5))
+
+    def add(self, path, md5):
+        """Hardlink a verified file into the store, a no-op if the content is already there"""
+        if not md5 or self.contains(md5):
+            return
+        try:
+            link_file(path, self.path_for(md5), copy=False)
+        except OSError:
+            pass  # filesystem without hardlinks, the store just stays empty
+
+    def link_into(self, md5, target):
+        """Materialize stored content at target. Returns False if the store does not have it"""
+        if not self.contains(md5):
+            return False
+        link_file(self.path_for(md5), target)
+        return True
+
+
+def get_store():
+    """Process-wide store, shared by every job"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ContentStore()
+        return _shared
+
+
+def link_file(source, target, copy=True):
+    """
+    Atomically place a hardlink of source at target, replacing whatever is there.
+    Falls back to a copy when hardlinks are not possible (other filesystem, FAT) unless `copy` is False.
+    """
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    tmp_path = target + ".link"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        if not copy:
+            raise
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, target)
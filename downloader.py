@@ -0,0 +1,473 @@
+import os
+import re
+import queue
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from manifest import get_manifest
+from content_store import link_file
+from telemetry import get_telemetry
+from tracing import span
+from helper_functions import sanitize_filename
+from web_scraping import scrape_tmdb_info, search_drive_links
+from google_drive import (download_file, crawl_folder, get_thread_service, get_file_metadata, get_files_metadata,
+                          DownloadCancelled, SEGMENT_THRESHOLD)
+
+DRIVE_ID_PATTERN = r"^[a-zA-Z0-9_-]{25,}$"
+UNORDERED = (float('inf'),)  # priority of non-episode files in sequential mode
+LAST = (float('inf'), float('inf'))  # priority of the stop sentinels, after every real job
+PLAYABLE_BUFFER = 128 * 1024 * 1024  # sequential mode starts the next file once the ones before it have this much
+
+
+def find_drive_links(query, headless_browser=False, refresh=False):
+    """
+    Turn a query (anime name, Drive link or bare folder id) into [name, url] pairs.
+    Anime names go through the search cache, `refresh` forces a new scrape.
+    """
+    if re.match(DRIVE_ID_PATTERN, query):
+        return [["Direct Input", f"https://drive.google.com/drive/folders/{query}"]]
+    if "drive.google.com" in query:
+        return [["Direct Input", query]]
+    return search_drive_links(query, headless=headless_browser, refresh=refresh)
+
+
+def _ignore(*_):
+    pass
+
+
+class DownloadJob:
+    """
+    Resolves and downloads everything behind one query's drive links.
+    Progress is reported through plain callbacks so the same job runs behind the
+    Qt DownloadWorker and the headless CLI.
+    """
+
+    def __init__(self, service, drive_links, query, max_workers=3, segments=1, segment_threshold=SEGMENT_THRESHOLD,
+                 on_text=print, on_progress=_ignore, content_store=None,
+                 post_processor=None, sequential=False, stream_server=None):
+        self.service = service
+        self.drive_links = drive_links
+        self.query = query
+        self.max_workers = max(1, max_workers)
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.on_text = on_text  # text updates
+        self.on_progress = on_progress  # overall percent
+        self.content_store = content_store  # optional ContentStore shared across titles and runs
+        self.post_processor = post_processor  # optional PostProcessor fed with every completed file
+        self.sequential = sequential  # lowest episode first, each file filled front to back
+        self.stream_server = stream_server  # optional StreamServer to announce playable URLs on
+        self.results = []  # one dict per file with the download/verification outcome
+        self._lock = threading.Lock()
+        self._jobs = None  # (priority, sequence, (file_id, file_name, base_path, metadata, info)) waiting for a download worker
+        self._sequence = itertools.count()
+        self._manifest = None
+        self._buffering = {}  # local_path -> (queue order, Event set once it has PLAYABLE_BUFFER bytes or ended)
+        self._tmdb_lookups = {}  # (query, content_type) -> Future, so links of one show share a lookup
+        self._file_metadata = Future()  # {file_id: Drive metadata} of single-file links, prefetched in batches
+        self._primaries = {}  # ('id', file_id) / ('md5', md5Checksum) -> local path of the copy being downloaded
+        self._duplicates = {}  # primary local path -> [(file_id, file_name, base_path, metadata, info)] to link once it is done
+        self._completed = {}  # primary local path -> same path once on disk, None if its download failed
+        self._resolved = False  # set once no more files can be queued, see _post_process
+        self._post_pending = []  # post-processing items ready to submit once resolving ends
+        self._movie_outstanding = {}  # movie folder -> its files queued but not finished yet
+        self._movie_held = {}  # movie folder -> post-processing items waiting for the rest of that movie
+        self._total_files = 0
+        self._downloaded_files = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop planning and downloading, keeping partial files so the job can resume later"""
+        self._cancelled.set()
+
+    def run(self):
+        """
+        Resolve every drive link on its own resolver thread and push the files it
+        yields onto a job queue that download threads drain from the start, so the
+        first episode begins downloading as soon as its own link is resolved.
+        """
+        self._jobs = queue.PriorityQueue(maxsize=self.max_workers * 4)
+        self._manifest = get_manifest()
+        downloaders = [threading.Thread(target=self._download_jobs, daemon=True) for _ in range(self.max_workers)]
+        for thread in downloaders:
+            thread.start()
+
+        # Prefetched next to resolution, so folder links and TMDB lookups never wait on it
+        threading.Thread(target=self._prefetch_file_metadata, daemon=True).start()
+
+        force_movie = self.query.endswith("-m")
+        query = self.query[:-2] if force_movie else self.query
+        with ThreadPoolExecutor(max_workers=self.max_workers) as resolvers:
+            futures = [resolvers.submit(self._traced_resolve, name, url, query, force_movie)
+                       for name, url in self.drive_links]
+            for (name, _), future in zip(self.drive_links, futures):
+                try:
+                    future.result()
+                except DownloadCancelled:
+                    pass
+                except Exception as e:
+                    self.on_text(f"❌ Failed to resolve {name}: {e}")
+
+        with self._lock:
+            self._resolved = True
+            pending = self._release_post_items()
+            percent = self._overall_percent()
+        for item in pending:
+            self.post_processor.submit(item)
+        if percent is not None:
+            self.on_progress(percent)
+
+        for _ in downloaders:
+            self._jobs.put((LAST, next(self._sequence), None))
+        for thread in downloaders:
+            thread.join()
+        self._manifest.save()
+
+        if self._cancelled.is_set():
+            raise DownloadCancelled()
+        if not self._total_files:
+            self.on_text("No files to download.")
+        return self.results
+
+    def _prefetch_file_metadata(self):
+        """Fetch name, size, mimeType and md5 of every single-file link in batched round trips"""
+        file_ids = [match.group(1) for _, url in self.drive_links
+                    for match in [re.search(r"/file/d/([a-zA-Z0-9_-]+)", url)] if match]
+        fetched = {}
+        try:
+            if file_ids:
+                fetched = get_files_metadata(self.service, file_ids)
+        except Exception as e:
+            self.on_text(f"⚠️ Could not prefetch file metadata, fetching per file instead: {e}")
+        finally:
+            # Failed lookups are left out so the download path fetches them again and reports the error
+            self._file_metadata.set_result({file_id: item for file_id, item in fetched.items() if isinstance(item, dict)})
+
+    def _lookup_tmdb(self, query, content_type):
+        """Scrape TMDB once per (query, content_type) even when several links resolve at the same time"""
+        with self._lock:
+            future = self._tmdb_lookups.get((query, content_type))
+            owner = future is None
+            if owner:
+                future = self._tmdb_lookups[(query, content_type)] = Future()
+        if owner:
+            try:
+                future.set_result(scrape_tmdb_info(query, content_type=content_type))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def _traced_resolve(self, name, url, anime_name, force_movie):
+        with span('resolve', link=name):
+            self._resolve_link(name, url, anime_name, force_movie)
+
+    def _resolve_link(self, name, url, anime_name, force_movie):
+        match_folder = re.search(r"/folders/([a-zA-Z0-9_-]+)", url)
+        match_file = re.search(r"/file/d/([a-zA-Z0-9_-]+)", url)
+        is_movie = force_movie or "movie" in (anime_name or name).lower() or "film" in (anime_name or name).lower()
+        tmdb_query = anime_name or name
+
+        if is_movie:
+            title, year, tmdb_id = self._lookup_tmdb(tmdb_query, "movie")
+            safe_title = sanitize_filename(title)
+            folder_name = f"{safe_title} ({year}) [tmdbid-{tmdb_id}]"
+            base_path = os.path.join("downloads", folder_name)
+            os.makedirs(base_path, exist_ok=True)
+            info = {'kind': 'movie', 'root': base_path, 'title': title, 'year': year, 'tmdb_id': tmdb_id}
+            if match_folder:
+                folder_id = match_folder.group(1)
+                for file_item in crawl_folder(self.service, folder_id, self.max_workers):
+                    subdir = os.path.dirname(file_item['path'])
+                    self._queue_download(file_item['id'], file_item['name'],
+                                         os.path.join(base_path, subdir), file_item, info)
+            elif match_file:
+                metadata = self._file_metadata.result().get(match_file.group(1))
+                file_name = sanitize_filename(metadata['name']) if metadata else name
+                self._queue_download(match_file.group(1), file_name, base_path, metadata, info)
+        else:
+            # Series logic
+            title, year, tmdb_id = self._lookup_tmdb(tmdb_query, "tv")
+            if tmdb_id == "unknown":
+                self.on_text(f"⚠️ No TMDB info found for '{tmdb_query}'. Using defaults.")
+            safe_title = sanitize_filename(title)
+            root_folder = os.path.join("downloads", f"{safe_title} ({year}) [tmdbid-{tmdb_id}]")
+            os.makedirs(root_folder, exist_ok=True)
+            season_match = re.search(r"Season\s*(\d+)", name, re.IGNORECASE)
+            season_num = int(season_match.group(1)) if season_match else 1
+            season_folder = f"Season {season_num:02d}"
+            base_path = os.path.join(root_folder, season_folder)
+            os.makedirs(base_path, exist_ok=True)
+            info = {'kind': 'episode', 'root': root_folder, 'title': title, 'year': year, 'tmdb_id': tmdb_id}
+            episode_counter = 1
+            if match_folder:
+                folder_id = match_folder.group(1)
+                episode_counters = {}
+                for file_item in crawl_folder(self.service, folder_id, self.max_workers):
+                    # Files directly in a top-level "Season N" subfolder are episodes of that season,
+                    # anything in other or deeper subfolders (extras, specials) keeps its name and layout
+                    subdir = os.path.dirname(file_item['path'])
+                    parts = subdir.split(os.sep) if subdir else []
+                    subdir_season = re.match(r"Season\s*(\d+)", parts[0], re.IGNORECASE) if parts else None
+                    if parts and not (subdir_season and len(parts) == 1):
+                        self._queue_download(file_item['id'], file_item['name'],
+                                             os.path.join(base_path, subdir), file_item, dict(info, kind='extra'))
+                        continue
+                    item_season = int(subdir_season.group(1)) if subdir_season else season_num
+                    episode_counters[item_season] = episode_counters.get(item_season, 0) + 1
+                    ext = os.path.splitext(file_item['name'])[1]
+                    episode_name = f"{safe_title} S{item_season:02d}E{episode_counters[item_season]:02d}{ext}"
+                    self._queue_download(file_item['id'], episode_name,
+                                         os.path.join(root_folder, f"Season {item_season:02d}"), file_item,
+                                         dict(info, episode=(item_season, episode_counters[item_season])))
+            elif match_file:
+                metadata = self._file_metadata.result().get(match_file.group(1))
+                source_name = metadata['name'] if metadata else name
+                ext = os.path.splitext(source_name)[1] if "." in source_name else ".mkv"
+                episode_name = f"{safe_title} S{season_num:02d}E{episode_counter:02d}{ext}"
+                self._queue_download(match_file.group(1), episode_name, base_path, metadata,
+                                     dict(info, episode=(season_num, episode_counter)))
+
+    def _queue_download(self, file_id, fname, base_path, metadata=None, info=None):
+        """
+        Push a file onto the job queue, waiting if the download threads are far behind.
+        A file whose id or md5 was already queued in this run is not downloaded again,
+        it is linked to the first copy once that one is on disk.
+        """
+        if self._cancelled.is_set():
+            raise DownloadCancelled()
+        local_path = os.path.join(base_path, fname)
+        keys = [('id', file_id)]
+        if metadata and metadata.get('md5Checksum'):
+            keys.append(('md5', metadata['md5Checksum']))
+        with self._lock:
+            primary = next((self._primaries[key] for key in keys if key in self._primaries), None)
+            if primary == local_path:
+                return
+            self._total_files += 1
+            if info and info.get('kind') == 'movie':
+                self._movie_outstanding[info['root']] = self._movie_outstanding.get(info['root'], 0) + 1
+            if primary is None:
+                for key in keys:
+                    self._primaries[key] = local_path
+            elif primary not in self._completed:
+                self._duplicates.setdefault(primary, []).append((file_id, fname, base_path, metadata, info))
+                return
+        if primary is None:
+            # Sequential mode hands out the lowest queued episode first, otherwise files go in queue order
+            priority = (info or {}).get('episode', UNORDERED) if self.sequential else ()
+            self._jobs.put((priority, next(self._sequence), (file_id, fname, base_path, metadata, info)))
+        else:
+            self._link_duplicate(self._completed[primary], file_id, fname, base_path, metadata, info)
+
+    def _download_jobs(self):
+        while True:
+            priority, sequence, job = self._jobs.get()
+            if job is None:
+                return
+            if self._cancelled.is_set():
+                continue
+            done = set()  # steps of _finish_job that ran, so a failure in a later one does not repeat them
+            try:
+                result = self._download_job(priority, sequence, job)
+                if result is not None:
+                    self._finish_job(job, result, done)
+            except Exception as e:
+                # Keep this thread alive whatever went wrong: resolvers block on the queue if every
+                # download thread is gone, and the file still has to be counted and its duplicates released
+                self.on_text(f"❌ Failed to finish {job[1]}: {e}")
+                result = {'file_id': job[0], 'path': os.path.join(job[2], job[1]), 'status': 'failed', 'error': str(e)}
+                try:
+                    self._finish_job(job, result, done)
+                except Exception as e:
+                    self.on_text(f"❌ Failed to finish {job[1]}: {e}")
+
+    def _download_job(self, priority, sequence, job):
+        """Download one queued file, returning its result, None if it was cancelled"""
+        fname = job[1]
+        local_path = os.path.join(job[2], fname)
+        if self.sequential:
+            # Registered as soon as it is taken, so files taken after it wait for its buffer
+            with self._lock:
+                self._buffering[local_path] = ((priority, sequence), threading.Event())
+        try:
+            return self._download_one(*job[:4])
+        except DownloadCancelled:
+            return None
+        except Exception as e:
+            self.on_text(f"❌ Failed to download {fname}: {e}")
+            return {'file_id': job[0], 'path': local_path, 'status': 'failed', 'error': str(e)}
+        finally:
+            with self._lock:
+                entry = self._buffering.pop(local_path, None)
+            if entry:
+                entry[1].set()
+
+    def _finish_job(self, job, result, done):
+        """Count a finished file, link its duplicates and post-process it, skipping the steps in `done`"""
+        local_path = os.path.join(job[2], job[1])
+        if 'result' not in done:
+            done.add('result')
+            self._add_result(result)
+        if 'duplicates' not in done:
+            done.add('duplicates')
+            with self._lock:
+                source = self._completed[local_path] = None if result['status'] == 'failed' else result['path']
+                duplicates = self._duplicates.pop(local_path, [])
+            for duplicate in duplicates:
+                self._link_duplicate(source, *duplicate)
+        if 'post' not in done:
+            done.add('post')
+            self._post_process(result, job[3], job[4])
+
+    def _add_result(self, result):
+        with self._lock:
+            self.results.append(result)
+            self._downloaded_files += 1
+            percent = self._overall_percent()
+        if percent is not None:
+            self.on_progress(percent)
+
+    def _overall_percent(self):
+        """
+        Share of files done, called with the lock held. None until every link is resolved:
+        before that the total is still growing and the percent could go backwards.
+        """
+        if not self._resolved or not self._total_files:
+            return None
+        return int(self._downloaded_files / self._total_files * 100)
+
+    def _link_duplicate(self, source, file_id, fname, base_path, metadata=None, info=None):
+        """Hardlink (or copy) a file already downloaded in this run to another place it is wanted"""
+        local_path = os.path.join(base_path, fname)
+        current_path = self._manifest.resolve_path(file_id, local_path)
+        metadata = metadata or {}
+        if source is None:
+            result = {'file_id': file_id, 'path': local_path, 'status': 'failed',
+                      'error': "duplicate of a file that failed to download"}
+        else:
+            try:
+                if self._manifest.is_current(file_id, current_path, metadata.get('size'),
+                                             metadata.get('md5Checksum'), metadata.get('modifiedTime')):
+                    result = {'file_id': file_id, 'path': current_path, 'status': 'skipped'}
+                else:
+                    link_file(source, local_path)
+                    self._manifest.record(file_id, local_path, metadata.get('md5Checksum'),
+                                          metadata.get('modifiedTime'))
+                    self.on_text(f"Linked {fname} to {source}, same file")
+                    result = {'file_id': file_id, 'path': local_path, 'status': 'linked', 'source': source,
+                              'md5': metadata.get('md5Checksum')}
+            except OSError as e:
+                self.on_text(f"❌ Failed to link {fname}: {e}")
+                result = {'file_id': file_id, 'path': local_path, 'status': 'failed', 'error': str(e)}
+        self._add_result(result)
+        self._post_process(result, metadata, info)
+
+    def _post_process(self, result, metadata, info):
+        """
+        Hand a finished file to the post-processor without waiting for it. Called for every
+        result, including skipped and failed ones, so movie folders can be counted down.
+        Files completed while links are still resolving are held back until resolving ends,
+        so no step renames a file that a later duplicate still has to be linked from, and
+        files of a movie are held until every file of that movie is finished, so steps
+        see the whole folder (the trailer is not renamed before the film arrives).
+        """
+        if not info:
+            return
+        item = None
+        if self.post_processor and result['status'] in ('downloaded', 'linked'):
+            item = dict(info, file_id=result['file_id'], path=result['path'], md5=result.get('md5'),
+                        modified_time=(metadata or {}).get('modifiedTime'))
+        with self._lock:
+            if info.get('kind') == 'movie':
+                self._movie_outstanding[info['root']] -= 1
+                if item:
+                    self._movie_held.setdefault(info['root'], []).append(item)
+            elif item:
+                self._post_pending.append(item)
+            ready = self._release_post_items()
+        for item in ready:
+            self.post_processor.submit(item)
+
+    def _release_post_items(self):
+        """Items that may be post-processed now, called with the lock held"""
+        if not self._resolved:
+            return []
+        ready, self._post_pending = self._post_pending, []
+        for root in [root for root, count in self._movie_outstanding.items() if count == 0]:
+            del self._movie_outstanding[root]
+            ready.extend(self._movie_held.pop(root, []))
+        return ready
+
+    def _download_one(self, file_id, fname, base_path, metadata=None):
+        """
+        Download a single file on a pool thread using that thread's own Drive service.
+        Returns the outcome as a dict, with status 'skipped' when the manifest shows
+        the file is already on disk and unchanged.
+        """
+        service = get_thread_service(self.service)
+        if metadata is None:
+            metadata = get_file_metadata(service, file_id)
+        local_path = os.path.join(base_path, fname)
+        current_path = self._manifest.resolve_path(file_id, local_path)
+        if self._manifest.is_current(file_id, current_path, metadata['size'],
+                                     metadata.get('md5Checksum'), metadata.get('modifiedTime')):
+            self.on_text(f"Skipping {fname}, already up to date")
+            return {'file_id': file_id, 'path': current_path, 'status': 'skipped'}
+
+        md5 = metadata.get('md5Checksum')
+        if self.content_store and self.content_store.link_into(md5, local_path):
+            self._manifest.record(file_id, local_path, md5, metadata.get('modifiedTime'))
+            self.on_text(f"Linked {fname} from the content store")
+            return {'file_id': file_id, 'path': local_path, 'status': 'linked', 'source': self.content_store.path_for(md5),
+                    'md5': md5}
+
+        buffered = self._wait_for_buffers(local_path)
+        self.on_text(f"Starting download: {fname}")
+        if self.stream_server:
+            self.on_text(f"▶️ Play while downloading: {self.stream_server.url_for(local_path)}")
+        telemetry = get_telemetry()
+        telemetry.start_file(local_path, fname, metadata['size'])
+
+        def on_bytes(done, received):
+            telemetry.add_bytes(local_path, received, done)
+            if buffered is not None and done >= PLAYABLE_BUFFER:
+                buffered.set()
+
+        try:
+            result = download_file(service, file_id, fname, base_path,
+                                   segments=self.segments, segment_threshold=self.segment_threshold,
+                                   size=metadata['size'], md5=metadata.get('md5Checksum'),
+                                   cancel_event=self._cancelled, sequential=self.sequential,
+                                   bytes_callback=on_bytes)
+        finally:
+            telemetry.finish_file(local_path)
+
+        if result['verified']:
+            retried = " after a re-download" if result['attempts'] > 1 else ""
+            self.on_text(f"Downloaded {fname} (md5 verified{retried})")
+        else:
+            self.on_text(f"Downloaded {fname} (no checksum from Drive, not verified)")
+        self._manifest.record(file_id, local_path, result['md5'], metadata.get('modifiedTime'))
+        if self.content_store and result['verified']:
+            self.content_store.add(local_path, result['md5'])
+        return dict(result, file_id=file_id, status='downloaded')
+
+    def _wait_for_buffers(self, local_path):
+        """
+        Sequential mode: wait until every file taken before this one has a playable buffer, so the
+        lowest episode gets all connections until it can be watched. Returns this file's Event,
+        None outside sequential mode.
+        """
+        with self._lock:
+            entry = self._buffering.get(local_path)
+        if entry is None:
+            return None
+        while True:
+            with self._lock:
+                earlier = [event for order, event in self._buffering.values() if order < entry[0] and not event.is_set()]
+            if not earlier:
+                return entry[1]
+            earlier[0].wait(0.5)
+            if self._cancelled.is_set():
+                raise DownloadCancelled()
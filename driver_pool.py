@@ -0,0 +1,122 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from tracing import span
+
+POOL_SIZE = 2
+MAX_USES = 50
+MAX_AGE = 30 * 60
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class DriverPool:
+    """
+    Pool of warm Chrome sessions.
+    A session is handed to one caller at a time, checked for health before reuse,
+    and recycled once it has crashed, served MAX_USES scrapes or lived MAX_AGE seconds.
+    """
+
+    def __init__(self, size=POOL_SIZE, headless=True):
+        self.headless = headless
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # [driver, created_at, uses]
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def driver(self):
+        self._slots.acquire()
+        try:
+            entry = self._checkout()
+            try:
+                yield entry[0]
+            finally:
+                self._checkin(entry)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            _quit(entry[0])
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("WebDriver pool has been shut down")
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return [self._create(), time.time(), 0]
+            if self._is_usable(entry):
+                return entry
+            _quit(entry[0])
+
+    def _checkin(self, entry):
+        entry[2] += 1
+        try:
+            entry[0].get("about:blank")
+        except Exception:  # WebDriverException, or urllib3/connection errors once chromedriver died
+            _quit(entry[0])
+            return
+        with self._lock:
+            if self._closed:
+                _quit(entry[0])
+            else:
+                self._idle.append(entry)
+
+    def _create(self):
+        # Selenium is only imported once a browser is actually needed, keeping startup light
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument("--headless")
+        options.add_argument("--window-size=1400,900")
+        with span('webdriver.start', 'webdriver', headless=self.headless):
+            return webdriver.Chrome(options=options)
+
+    @staticmethod
+    def _is_usable(entry):
+        driver, created_at, uses = entry
+        if uses >= MAX_USES or time.time() - created_at > MAX_AGE:
+            return False
+        try:
+            driver.current_url  # round trip to the browser, fails if the session crashed
+            return True
+        except Exception:  # chromedriver itself gone surfaces as urllib3/connection errors
+            return False
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def configure(size):
+    """Set the size used for pools created from now on"""
+    global POOL_SIZE
+    POOL_SIZE = max(1, size)
+
+
+def get_pool(headless=True):
+    with _pools_lock:
+        if headless not in _pools:
+            _pools[headless] = DriverPool(POOL_SIZE, headless)
+        return _pools[headless]
+
+
+def shutdown_pools():
+    """Quit every pooled browser, called when the main window closes"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
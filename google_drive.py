@@ -1,18 +1,121 @@
 import os
-import io
+import sys
+import json
+import hashlib
+import time
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 
+import httplib2
+import requests
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.auth.exceptions import RefreshError
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaIoBaseDownload
+from google.auth.transport.requests import AuthorizedSession, Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+from tracing import span
+from helper_functions import sanitize_filename
+
 TOKEN = 'login_files/token.json'
 CREDENTIALS = 'login_files/credentials.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
-def authenticate_drive_api():
+CHUNK_SIZE = 16 * 1024 * 1024
+FIRST_CHUNK_SIZE = 1024 * 1024
+SEGMENT_THRESHOLD = 1024 ** 3
+HTTP_POOL_SIZE = 16
+HTTP_TIMEOUT = 120
+MAX_RETRIES = 6
+BATCH_SIZE = 100
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError', 'internalError'}
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+PARENTS_PER_QUERY = 20
+LIST_FIELDS = 'id, name, mimeType, size, md5Checksum, modifiedTime, parents'
+METADATA_FIELDS = 'id, name, mimeType, size, md5Checksum, modifiedTime'
+
+_thread_local = threading.local()
+_active_parts = {}  # real target path -> _PartState of downloads in progress, read by the stream server
+_active_parts_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire` takes `amount` tokens, sleeping for as long
+    as the bucket is in deficit. A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+# Shared by every thread so the whole process stays inside Drive's per-user quotas.
+# Drive counts requests over 100 second windows, so the request bucket holds a full
+# batch: one get_files_metadata round trip does not hold up the requests after it.
+_request_limiter = TokenBucket(10, capacity=BATCH_SIZE)
+_bandwidth_limiter = TokenBucket(0)
+
+def configure_limits(requests_per_second=10, bandwidth_bytes_per_second=0):
+    """Set the global Drive request rate and download bandwidth cap (0 = unlimited)"""
+    global _request_limiter, _bandwidth_limiter
+    _request_limiter = TokenBucket(requests_per_second, capacity=max(requests_per_second, BATCH_SIZE))
+    _bandwidth_limiter = TokenBucket(bandwidth_bytes_per_second, capacity=CHUNK_SIZE)
+
+def execute(request):
+    """
+    Execute a Drive API request through the global rate limiter, retrying rate-limit,
+    5xx and connection errors with exponential backoff and full jitter.
+    """
+    with span(getattr(request, 'methodId', None) or 'drive.batch', 'drive'):
+        for attempt in range(MAX_RETRIES + 1):
+            _request_limiter.acquire()
+            try:
+                return request.execute()
+            except HttpError as e:
+                if attempt == MAX_RETRIES or not _is_retryable(e):
+                    raise
+            except (OSError, httplib2.HttpLib2Error):
+                if attempt == MAX_RETRIES:
+                    raise
+            time.sleep(random.uniform(0, min(64, 2 ** attempt)))
+
+def _is_retryable(error):
+    status = error.resp.status
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        try:
+            reasons = {item.get('reason') for item in json.loads(error.content)['error'].get('errors', [])}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        return bool(reasons & RETRYABLE_REASONS)
+    return False
+
+def get_credentials(interactive=True):
+    """
+    Load the saved token, refreshing it when expired. Without a usable token the
+    browser OAuth flow runs, unless `interactive` is False (headless runs), which raises instead.
+    """
     creds = None
     if os.path.exists(TOKEN):
         creds = Credentials.from_authorized_user_file(TOKEN, SCOPES)
@@ -21,6 +124,8 @@ def authenticate_drive_api():
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
+            elif not interactive:
+                raise RuntimeError(f"No valid Drive token in {TOKEN}, sign in once from the GUI first")
             else:
                 flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS, SCOPES)
                 creds = flow.run_local_server(port=0)
@@ -28,7 +133,9 @@ def authenticate_drive_api():
                 token.write(creds.to_json())
 
     except RefreshError:
-        print("⚠️  Invalid or expired token detected. Removing old token and retrying...")
+        if not interactive:
+            raise RuntimeError(f"Drive token in {TOKEN} can no longer be refreshed, sign in again from the GUI")
+        print("⚠️  Invalid or expired token detected. Removing old token and retrying...", file=sys.stderr)
         if os.path.exists(TOKEN):
             os.remove(TOKEN)
         flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS, SCOPES)
@@ -36,32 +143,473 @@ def authenticate_drive_api():
         with open(TOKEN, 'w') as token:
             token.write(creds.to_json())
 
-    return build('drive', 'v3', credentials=creds)
+    return creds
+
+def authenticate_drive_api(interactive=True, pool_size=HTTP_POOL_SIZE):
+    """Build the Drive service on a pooled keep-alive transport that all worker threads share"""
+    # The discovery document bundled with the client is used, so building needs no network round trip
+    return build('drive', 'v3', http=PooledHttp(get_credentials(interactive), pool_size),
+                 static_discovery=True, cache_discovery=False)
+
+class PooledHttp:
+    """
+    httplib2-compatible transport for googleapiclient backed by a google-auth
+    AuthorizedSession. The underlying urllib3 pool keeps up to `pool_size`
+    connections alive and is safe to use from many threads at once, so TLS
+    handshakes are paid once per connection rather than once per worker.
+    """
+
+    def __init__(self, credentials, pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+        self.credentials = credentials
+        self.timeout = timeout
+        self.session = AuthorizedSession(credentials)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout)
+        info = {key.lower(): value for key, value in response.headers.items()}
+        info.pop('content-encoding', None)  # requests has already decoded the body
+        info['status'] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+    def close(self):
+        self.session.close()
+
+def get_thread_service(service):
+    """
+    Return a Drive service the calling thread can use.
+    Services on a PooledHttp are shared as they are. The plain httplib2 transport
+    is not thread-safe, so for those every worker thread builds its own service
+    from the credentials of the shared one.
+    """
+    if isinstance(service._http, PooledHttp):
+        return service
+    services = getattr(_thread_local, 'services', None)
+    if services is None:
+        services = _thread_local.services = {}
+    key = id(service)
+    if key not in services:
+        services[key] = build('drive', 'v3', credentials=service._http.credentials,
+                              static_discovery=True, cache_discovery=False)
+    return services[key]
+
+def get_file_metadata(service, file_id):
+    item = execute(service.files().get(fileId=file_id, fields=METADATA_FIELDS, supportsAllDrives=True))
+    item['size'] = int(item.get('size', 0))
+    return item
+
+def get_files_metadata(service, file_ids):
+    """
+    Fetch metadata for many files using Drive batch requests, BATCH_SIZE files.get
+    calls per HTTP round trip. Returns {file_id: metadata dict or the HttpError for
+    that file}. Items that hit a retryable error are batched again with backoff.
+    """
+    results = {}
+    pending = list(dict.fromkeys(file_ids))
+    for attempt in range(MAX_RETRIES + 1):
+        retry = []
+        for i in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[i:i + BATCH_SIZE]
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    response['size'] = int(response.get('size', 0))
+                    results[request_id] = response
+                elif attempt < MAX_RETRIES and isinstance(exception, HttpError) and _is_retryable(exception):
+                    retry.append(request_id)
+                else:
+                    results[request_id] = exception
+
+            batch = service.new_batch_http_request(callback=callback)
+            for file_id in chunk:
+                batch.add(service.files().get(fileId=file_id, fields=METADATA_FIELDS, supportsAllDrives=True),
+                          request_id=file_id)
+            _request_limiter.acquire(len(chunk) - 1)  # every call in the batch counts against the quota
+            execute(batch)
+        if not retry:
+            break
+        pending = retry
+        time.sleep(random.uniform(0, min(64, 2 ** attempt)))
+    return results
 
 def list_files_in_folder(service, folder_id):
-    files, page_token = [], None
+    return list(iter_files_in_folder(service, folder_id))
+
+def iter_files_in_folder(service, folder_id):
+    """Yield the children of one folder page by page, in name order"""
+    yield from _iter_children(service, [folder_id])
+
+def crawl_folder(service, folder_id, max_workers=4):
+    """
+    Walk a folder and all of its subfolders breadth-first, yielding files as soon as
+    the page that lists them arrives.
+    Each level is listed with several requests in flight, and each request covers
+    up to PARENTS_PER_QUERY folders through a combined 'in parents' query.
+    Yields dicts with id, name, path (relative to the folder), size, md5Checksum,
+    modifiedTime and mimeType. Within a folder files come in name order. Google Docs files have no
+    binary content and are left out.
+    Names and path components are sanitized for the local filesystem; folders whose name
+    is empty, '.' or '..' after that are flattened into their parent.
+    """
+    paths = {folder_id: ''}
+    level = [folder_id]
+    pages = queue.Queue(maxsize=max_workers * 2)
+    stop = threading.Event()
+    running = 0
+
+    def list_batch(batch):
+        try:
+            for item in _iter_children(service, batch):
+                if stop.is_set():
+                    return
+                pages.put(item)
+        finally:
+            pages.put(None)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while level:
+            batches = [level[i:i + PARENTS_PER_QUERY] for i in range(0, len(level), PARENTS_PER_QUERY)]
+            futures = [executor.submit(list_batch, batch) for batch in batches]
+            level, running = [], len(futures)
+            while running:
+                item = pages.get()
+                if item is None:
+                    running -= 1
+                    continue
+                parent = next((p for p in item.get('parents', []) if p in paths), folder_id)
+                name = _path_component(item['name'])
+                if item['mimeType'] == FOLDER_MIME:
+                    paths[item['id']] = os.path.join(paths[parent], name) if name else paths[parent]
+                    level.append(item['id'])
+                elif not item['mimeType'].startswith('application/vnd.google-apps.'):
+                    name = name or item['id']
+                    yield {
+                        'id': item['id'],
+                        'name': name,
+                        'path': os.path.join(paths[parent], name) if paths[parent] else name,
+                        'size': int(item.get('size', 0)),
+                        'md5Checksum': item.get('md5Checksum'),
+                        'modifiedTime': item.get('modifiedTime'),
+                        'mimeType': item['mimeType'],
+                    }
+            for future in futures:
+                future.result()
+    finally:
+        # The consumer may stop early, drain so no lister stays blocked on a full queue
+        stop.set()
+        while running:
+            if pages.get() is None:
+                running -= 1
+        executor.shutdown(wait=True)
+
+def _path_component(name):
+    """A Drive name made safe as one local path component, '' when nothing usable is left"""
+    name = sanitize_filename(name).rstrip(' .')
+    return '' if name in ('', '.', '..') else name
+
+def _iter_children(service, parent_ids):
+    service = get_thread_service(service)
+    parents = ' or '.join(f"'{parent_id}' in parents" for parent_id in parent_ids)
+    page_token = None
     while True:
-        response = service.files().list(
-            q=f"'{folder_id}' in parents and trashed=false",
-            spaces='drive',
-            fields='nextPageToken, files(id, name)',
-            pageToken=page_token
-        ).execute()
-        files.extend(response.get('files', []))
+        with span('list', folders=len(parent_ids)):
+            response = execute(service.files().list(
+                q=f"({parents}) and trashed=false",
+                spaces='drive',
+                fields=f'nextPageToken, files({LIST_FIELDS})',
+                orderBy='name',
+                pageSize=1000,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ))
+        yield from response.get('files', [])
         page_token = response.get('nextPageToken', None)
         if not page_token:
             break
-    return files
 
-def download_file(service, file_id, file_name, save_path, progress_callback=None):
+class ChecksumMismatchError(IOError):
+    pass
+
+class DownloadCancelled(Exception):
+    pass
+
+def download_file(service, file_id, file_name, save_path,
+                  segments=1, segment_threshold=SEGMENT_THRESHOLD, size=None, md5=None, cancel_event=None,
+                  sequential=False, bytes_callback=None):
+    """
+    Download into '<name>.part', recording finished byte ranges in a '<name>.part.json'
+    sidecar so an interrupted download resumes where it stopped. The part file is
+    renamed onto the target only once every byte is present.
+    Pass `size` (and `md5`) when already known from a listing to skip the metadata request.
+    Bytes are hashed as they arrive in order and checked against Drive's md5Checksum
+    before the rename; on a mismatch the file is fetched once more from scratch.
+    Returns a dict with path, size, md5, expected_md5, verified and attempts.
+    Setting `cancel_event` stops the download after the current chunk, keeping the part file.
+    `sequential` fills the file front to back, `segments` connections working on consecutive
+    chunks starting with small ones, so it can be played while downloading (see get_part_state).
+    `bytes_callback(done, received)` is called for every chunk with the bytes on disk so far
+    and the bytes just received, for throughput telemetry.
+    """
     os.makedirs(save_path, exist_ok=True)
-    request = service.files().get_media(fileId=file_id)
-    fh = io.FileIO(os.path.join(save_path, file_name), 'wb')
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-        if status and progress_callback:
-            percent = int(status.progress() * 100)
-            progress_callback(percent)
+    target = os.path.join(save_path, file_name)
+    if size is None:
+        metadata = execute(service.files().get(fileId=file_id, fields='size, md5Checksum'))
+        size, md5 = int(metadata.get('size', 0)), metadata.get('md5Checksum')
+
+    for attempt in range(1, 3):
+        state = _PartState.load(target, file_id, size)
+        with _active_parts_lock:
+            _active_parts[os.path.realpath(target)] = state
+        try:
+            # Sequential chunks land slightly out of order, buffering them keeps the hash inline
+            hasher = _StreamingMd5(segments * CHUNK_SIZE if sequential else 0)
+            with span('download', file=file_name, size=size, attempt=attempt):
+                _fetch_missing(service, file_id, state, hasher,
+                               segments if sequential or size >= segment_threshold else 1, cancel_event,
+                               sequential, bytes_callback)
+
+            with span('verify', file=file_name):
+                digest = hasher.finish(state.part_path, size)
+            if md5 and digest != md5:
+                state.discard()
+                if attempt == 1:
+                    continue
+                raise ChecksumMismatchError(f"md5 mismatch for {file_name}: expected {md5}, got {digest}")
+
+            state.finish()
+        finally:
+            state.close()
+            with _active_parts_lock:
+                if _active_parts.get(os.path.realpath(target)) is state:
+                    del _active_parts[os.path.realpath(target)]
+        return {'path': target, 'size': size, 'md5': digest, 'expected_md5': md5,
+                'verified': bool(md5), 'attempts': attempt}
+
+def get_part_state(target):
+    """The in-progress download writing `target`, or None once it finished or was never started"""
+    with _active_parts_lock:
+        return _active_parts.get(os.path.realpath(target))
+
+def _fetch_missing(service, file_id, state, hasher, segments, cancel_event=None, sequential=False,
+                   bytes_callback=None):
+    missing = state.missing()
+    workers = len(missing)
+    if sequential:
+        missing = _sequential_chunks(missing)
+        workers = min(segments, len(missing))
+    elif segments > 1:
+        missing = _split_ranges(missing, segments)
+        workers = len(missing)
+
+    lock = threading.Lock()
+    progress = {'done': state.size - sum(end - start for start, end in missing)}
+
+    def on_chunk(offset, data):
+        hasher.update(offset, data)
+        with lock:
+            progress['done'] += len(data)
+            if bytes_callback:
+                bytes_callback(progress['done'], len(data))
+
+    # Set as soon as one range fails, so the others stop after their current chunk
+    # instead of fetching the rest of a file that cannot complete.
+    # In sequential mode every range is one chunk and the pool takes them in file order,
+    # so the connections work on a sliding window at the front of the missing bytes.
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_download_range, service, file_id, state, start, end, on_chunk, cancel_event,
+                                   stop_event=stop_event)
+                   for start, end in missing]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        errors = [future.exception() for future in done if future.exception() is not None]
+        if errors:
+            stop_event.set()
+            raise next((e for e in errors if not isinstance(e, DownloadCancelled)), errors[0])
+
+class _StreamingMd5:
+    """
+    md5 of a file that is written out of order.
+    Chunks that continue the hashed prefix are hashed in memory as they arrive, chunks
+    up to `max_buffer` bytes ahead of it are held until the gap is filled, which covers
+    a whole sequential download. Whatever could not be hashed inline (later segments,
+    bytes from an earlier run) is read back once at the end.
+    """
+
+    def __init__(self, max_buffer=0):
+        self._md5 = hashlib.md5()
+        self._position = 0
+        self._max_buffer = max_buffer
+        self._pending = {}  # offset -> chunk received ahead of the hashed prefix
+        self._buffered = 0
+        self._lock = threading.Lock()
+
+    def update(self, offset, data):
+        with self._lock:
+            if offset > self._position and self._buffered + len(data) <= self._max_buffer:
+                self._pending[offset] = data
+                self._buffered += len(data)
+            elif offset == self._position:
+                self._md5.update(data)
+                self._position += len(data)
+                while self._position in self._pending:
+                    data = self._pending.pop(self._position)
+                    self._buffered -= len(data)
+                    self._md5.update(data)
+                    self._position += len(data)
+
+    def finish(self, path, size):
+        with self._lock:
+            if self._position < size:
+                with open(path, 'rb') as fh:
+                    fh.seek(self._position)
+                    for block in iter(lambda: fh.read(CHUNK_SIZE), b''):
+                        self._md5.update(block)
+                self._position = size
+            self._pending.clear()
+            return self._md5.hexdigest()
+
+def _sequential_chunks(ranges):
+    """Cut ranges into chunks in file order, FIRST_CHUNK_SIZE doubling up to CHUNK_SIZE so the first bytes land quickly"""
+    chunks = []
+    chunk_size = FIRST_CHUNK_SIZE
+    for start, end in sorted(ranges):
+        while start < end:
+            chunks.append((start, min(start + chunk_size, end)))
+            start = chunks[-1][1]
+            chunk_size = min(chunk_size * 2, CHUNK_SIZE)
+    return chunks
+
+def _split_ranges(ranges, count):
+    """Split the largest ranges until there are enough to keep `count` connections busy"""
+    ranges = sorted(ranges)
+    while 0 < len(ranges) < count:
+        start, end = max(ranges, key=lambda r: r[1] - r[0])
+        if end - start < 2 * CHUNK_SIZE:
+            break
+        middle = start + (end - start) // 2
+        ranges.remove((start, end))
+        ranges.extend([(start, middle), (middle, end)])
+        ranges.sort()
+    return ranges
+
+def _download_range(service, file_id, state, start, end, on_chunk=None, cancel_event=None, stop_event=None):
+    """
+    Fetch bytes [start, end) in CHUNK_SIZE chunks, each chunk retried on its own by execute().
+    `stop_event` works like `cancel_event` but is internal to one download.
+    """
+    service = get_thread_service(service)
+    offset = start
+    with open(state.part_path, 'r+b') as fh:
+        while offset < end:
+            if any(event is not None and event.is_set() for event in (cancel_event, stop_event)):
+                raise DownloadCancelled()
+            chunk_end = min(offset + CHUNK_SIZE, end)
+            _bandwidth_limiter.acquire(chunk_end - offset)
+            request = service.files().get_media(fileId=file_id)
+            request.headers['Range'] = f'bytes={offset}-{chunk_end - 1}'
+            data = execute(request)
+            fh.seek(offset)
+            fh.write(data)
+            fh.flush()
+            state.add(offset, offset + len(data))
+            if on_chunk:
+                on_chunk(offset, data)
+            offset += len(data)
+
+class _PartState:
+    """Completed byte ranges of a '.part' file, persisted in a JSON sidecar"""
+
+    def __init__(self, target, file_id, size, ranges=None):
+        self.target = target
+        self.part_path = target + '.part'
+        self.state_path = target + '.part.json'
+        self.file_id = file_id
+        self.size = size
+        self.ranges = ranges or []
+        self.started_at = time.time()
+        self.closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @classmethod
+    def load(cls, target, file_id, size):
+        state = cls(target, file_id, size)
+        try:
+            with open(state.state_path, 'r') as f:
+                saved = json.load(f)
+            if (saved.get('file_id') == file_id and saved.get('size') == size
+                    and os.path.getsize(state.part_path) == size):
+                state.ranges = [tuple(r) for r in saved.get('ranges', [])]
+                return state
+        except (OSError, ValueError):
+            pass
+
+        # Nothing usable on disk, start over with a preallocated part file
+        with open(state.part_path, 'wb') as fh:
+            fh.truncate(size)
+        state.save()
+        return state
+
+    def missing(self):
+        gaps, position = [], 0
+        for start, end in sorted(self.ranges):
+            if start > position:
+                gaps.append((position, start))
+            position = max(position, end)
+        if position < self.size:
+            gaps.append((position, self.size))
+        return gaps
+
+    def add(self, start, end):
+        with self._lock:
+            merged = []
+            for r_start, r_end in sorted(self.ranges + [(start, end)]):
+                if merged and r_start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], r_end))
+                else:
+                    merged.append((r_start, r_end))
+            self.ranges = merged
+            self.save()
+            self._changed.notify_all()
+
+    def wait_for(self, start, end, timeout):
+        """Block until bytes [start, end) are on disk. False on timeout or once the download stopped"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while not self._covers(start, end):
+                remaining = deadline - time.monotonic()
+                if self.closed or remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
+
+    def close(self):
+        """Wake up readers waiting on bytes that will not arrive from this download"""
+        with self._lock:
+            self.closed = True
+            self._changed.notify_all()
+
+    def _covers(self, start, end):
+        return any(r_start <= start and end <= r_end for r_start, r_end in self.ranges)
+
+    def save(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'file_id': self.file_id, 'size': self.size, 'ranges': self.ranges}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def discard(self):
+        for path in (self.part_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
 
+    def finish(self):
+        if self.missing():
+            raise IOError(f"Download of {os.path.basename(self.target)} is incomplete")
+        os.replace(self.part_path, self.target)
+        os.remove(self.state_path)
@@ -1,10 +1,14 @@
-import os
-import re
-
-from web_scraping import scrape_tmdb_info
-from helper_functions import sanitize_filename
-from chromedriver_updating import update_chromedriver
-from google_drive import download_file, list_files_in_folder, authenticate_drive_api
+import threading
+
+# Only light modules are imported here so the window paints quickly. Selenium,
+# googleapiclient and the chromedriver updater load on worker threads when first needed.
+from job_queue import JobQueue, JobScheduler, QUEUED
+from driver_pool import configure as configure_driver_pool, shutdown_pools
+from content_store import get_store
+from post_processing import PostProcessor, resolve_steps, DEFAULT_STEPS
+from telemetry import get_telemetry, format_rate, format_eta
+from tracing import span, enable as enable_tracing, is_enabled as tracing_enabled, export_chrome_trace, format_summary
+from helper_functions import read_settings, write_settings, get_int_setting
 
 from PySide6.QtWidgets import (
     QTextEdit,
@@ -20,105 +24,150 @@ from PySide6.QtWidgets import (
 
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QAction, QIcon
-from PySide6.QtCore import QThread, Signal
+from PySide6.QtCore import QThread, QTimer, Signal
+
+SEGMENT_THRESHOLD_MB = 1024  # default for segment_threshold_mb, same as google_drive.SEGMENT_THRESHOLD
+UI_FPS = 10  # refresh rate of the transfer progress and throughput display
+TRACE_FILE = "trace.json"
 
-from web_scraping import scrape_drive_links
+
+class AuthWorker(QThread):
+    """Authenticates and builds the Drive service off the GUI thread"""
+    authenticated = Signal(object)  # the Drive service
+    failed = Signal(str)
+
+    def __init__(self, settings):
+        super().__init__()
+        self.settings = settings
+
+    def run(self):
+        try:
+            from google_drive import authenticate_drive_api, configure_limits
+
+            configure_limits(get_int_setting(self.settings, "drive_requests_per_second", 10),
+                             get_int_setting(self.settings, "max_download_kbps", 0) * 1024)
+            service = authenticate_drive_api(pool_size=get_int_setting(self.settings, "http_pool_size", 16))
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.authenticated.emit(service)
+
+
+class ChromedriverWorker(QThread):
+    """Runs the chromedriver check/update without blocking the window"""
+    log = Signal(str)
+
+    def run(self):
+        try:
+            from chromedriver_updating import update_chromedriver
+
+            update_chromedriver(self.log.emit)
+        except Exception as e:
+            self.log.emit(f"❌ Chromedriver update failed: {e}")
 
 
 class DownloadWorker(QThread):
+    """Drains the persistent job queue in the background, running each queued title as a DownloadJob"""
     progress_text = Signal(str)  # text updates
     progress_value = Signal(int)  # overall progress bar updates
-    file_progress = Signal(int)  # individual file progress bar updates
-    finished = Signal()  # download finished
+    job_finished = Signal(str)  # all downloads of a query finished
 
-    def __init__(self, service, drive_links, query):
+    def __init__(self, service, job_queue, max_jobs=1, max_workers=3, segments=1,
+                 segment_threshold=SEGMENT_THRESHOLD_MB * 1024 * 1024, content_store=None, post_steps=None,
+                 sequential=False, stream_server=None, trace_file=TRACE_FILE):
         super().__init__()
         self.service = service
-        self.drive_links = drive_links
-        self.query = query
+        self.max_workers = max_workers
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.content_store = content_store
+        self.post_processor = PostProcessor(post_steps, log=self.progress_text.emit)
+        self.sequential = sequential
+        self.stream_server = stream_server
+        self.trace_file = trace_file
+        self.scheduler = JobScheduler(job_queue, self._run_job, max_jobs, log=self.progress_text.emit)
+        self._active_jobs = set()
+        self._lock = threading.Lock()
 
     def run(self):
-        anime_name = self.query
-        files_map = []  # List of (file_id, file_name, base_path) for all files
-        for name, url in self.drive_links:
-            match_folder = re.search(r"/folders/([a-zA-Z0-9_-]+)", url)
-            match_file = re.search(r"/file/d/([a-zA-Z0-9_-]+)", url)
-            is_movie = "movie" in (anime_name or name).lower() or "film" in (anime_name or name).lower()
-            if anime_name.endswith("-m"):
-                is_movie = True
-                anime_name = anime_name[:-2]
-            tmdb_query = anime_name or self.query or name
-
-            if is_movie:
-                title, year, tmdb_id = scrape_tmdb_info(tmdb_query, content_type="movie")
-                safe_title = sanitize_filename(title)
-                folder_name = f"{safe_title} ({year}) [tmdbid-{tmdb_id}]"
-                base_path = os.path.join("downloads", folder_name)
-                os.makedirs(base_path, exist_ok=True)
-                if match_folder:
-                    folder_id = match_folder.group(1)
-                    files_list = sorted(list_files_in_folder(self.service, folder_id), key=lambda x: x['name'])
-                    for file_item in files_list:
-                        files_map.append((file_item['id'], file_item['name'], base_path))
-                elif match_file:
-                    files_map.append((match_file.group(1), name, base_path))
-            else:
-                # Series logic
-                title, year, tmdb_id = scrape_tmdb_info(tmdb_query, content_type="tv")
-                if tmdb_id == "unknown":
-                    self.progress_text.emit(f"⚠️ No TMDB info found for '{tmdb_query}'. Using defaults.")
-                safe_title = sanitize_filename(title)
-                root_folder = os.path.join("downloads", f"{safe_title} ({year}) [tmdbid-{tmdb_id}]")
-                os.makedirs(root_folder, exist_ok=True)
-                season_match = re.search(r"Season\s*(\d+)", name, re.IGNORECASE)
-                season_num = int(season_match.group(1)) if season_match else 1
-                season_folder = f"Season {season_num:02d}"
-                base_path = os.path.join(root_folder, season_folder)
-                os.makedirs(base_path, exist_ok=True)
-                episode_counter = 1
-                if match_folder:
-                    folder_id = match_folder.group(1)
-                    files_list = sorted(list_files_in_folder(self.service, folder_id), key=lambda x: x['name'])
-                    for file_item in files_list:
-                        ext = os.path.splitext(file_item['name'])[1]
-                        episode_name = f"{safe_title} S{season_num:02d}E{episode_counter:02d}{ext}"
-                        files_map.append((file_item['id'], episode_name, base_path))
-                        episode_counter += 1
-                elif match_file:
-                    ext = os.path.splitext(name)[1] if "." in name else ".mkv"
-                    episode_name = f"{safe_title} S{season_num:02d}E{episode_counter:02d}{ext}"
-                    files_map.append((match_file.group(1), episode_name, base_path))
-
-        if not files_map:
-            self.progress_text.emit("No files to download.")
-            self.finished.emit()
-            return
-
-        total_files = len(files_map)
-        downloaded_files = 0
-
-        for file_id, fname, base_path in files_map:
-            self.progress_text.emit(f"Starting download: {fname}")
+        self.scheduler.run()
+
+    def wake(self):
+        self.scheduler.wake()
+
+    def stop(self):
+        """Stop taking jobs and cancel running ones, their partial files resume on the next start"""
+        self.scheduler.stop()
+        self.post_processor.shutdown(wait=False)
+        if self.stream_server:
+            self.stream_server.stop()
+        with self._lock:
+            for job in self._active_jobs:
+                job.cancel()
+
+    def _run_job(self, job_id, query):
+        try:
+            with span('job', query=query):
+                return self._run_query(query)
+        finally:
+            if tracing_enabled():
+                self._write_trace()
+
+    def _write_trace(self):
+        """Export every span recorded so far and log the per-phase summary"""
+        try:
+            export_chrome_trace(self.trace_file)
+            self.progress_text.emit(f"Trace written to {self.trace_file}\n{format_summary()}")
+        except OSError as e:
+            self.progress_text.emit(f"⚠️ Could not write trace: {e}")
 
-            # Wrap download_file with progress callback
-            download_file(self.service, file_id, fname, base_path,
-                          progress_callback=lambda p: self.file_progress.emit(p))
+    def _run_query(self, query):
+        from downloader import DownloadJob, find_drive_links
 
-            self.progress_text.emit(f"Downloaded {fname}")
-            downloaded_files += 1
-            percent = int(downloaded_files / total_files * 100)
-            self.progress_value.emit(percent)
+        self.progress_text.emit(f"Processing: {query}")
+        drive_links = find_drive_links(query)
+        if not drive_links:
+            self.progress_text.emit(f"No Google Drive links found for '{query}'.")
+            return []
 
-        self.finished.emit()
+        for i, (name, url) in enumerate(drive_links):
+            self.progress_text.emit(f"{i}: {name} -> {url}")
+
+        job = DownloadJob(self.service, drive_links, query, self.max_workers, self.segments, self.segment_threshold,
+                          on_text=self.progress_text.emit,
+                          on_progress=self.progress_value.emit,
+                          content_store=self.content_store,
+                          post_processor=self.post_processor,
+                          sequential=self.sequential, stream_server=self.stream_server)
+        with self._lock:
+            self._active_jobs.add(job)
+        try:
+            results = job.run()
+        finally:
+            with self._lock:
+                self._active_jobs.discard(job)
+        self.job_finished.emit(query)
+        return results
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         # Initialize all instance attributes
         self.is_movie = None
+        self.settings = {}
         self.auto_update_chromedriver = False
+        self.max_concurrent_downloads = 3
+        self.download_segments = 4
+        self.segment_threshold_mb = SEGMENT_THRESHOLD_MB
+        self.max_concurrent_jobs = 1
+        self.use_content_store = False
+        self.sequential_downloads = False
+        self.stream_port = 8765
         self.worker = None
-        self.service = authenticate_drive_api()
+        self.auth_worker = None
+        self.chromedriver_worker = None
+        self.service = None
+        self.job_queue = JobQueue()
         self.query = None
         self.chromedriver_auto_update_action = None
 
@@ -130,6 +179,8 @@ class MainWindow(QMainWindow):
         self.progress_log = None
         self.progress_bar = None
         self.file_progress_bar = None
+        self.transfer_label = None
+        self.telemetry_timer = None
         self.widget = None
 
         self.setWindowTitle("cartoonspoon")
@@ -141,7 +192,53 @@ class MainWindow(QMainWindow):
         self.setup_ui()
 
         if self.auto_update_chromedriver:
-            update_chromedriver(self.progress_log.append)
+            self.update_chromedriver()
+
+        # Queries can be queued right away, the worker starts draining once Drive is authenticated
+        self.auth_worker = AuthWorker(self.settings)
+        self.auth_worker.authenticated.connect(self.start_worker)
+        self.auth_worker.failed.connect(lambda error: self.progress_log.append(f"❌ Drive sign-in failed: {error}"))
+        self.auth_worker.start()
+
+    def update_chromedriver(self):
+        """Check chromedriver on a background thread, at most one check at a time"""
+        if self.chromedriver_worker and self.chromedriver_worker.isRunning():
+            return
+        self.chromedriver_worker = ChromedriverWorker()
+        self.chromedriver_worker.log.connect(self.progress_log.append)
+        self.chromedriver_worker.start()
+
+    def start_worker(self, service):
+        """Start draining the job queue, picking up jobs left unfinished by the last session"""
+        self.service = service
+        try:
+            post_steps = resolve_steps(self.settings.get("post_processing_steps", DEFAULT_STEPS))
+        except ValueError as e:
+            self.progress_log.append(f"⚠️ {e}, using the default post-processing steps")
+            post_steps = None
+        stream_server = None
+        if self.sequential_downloads:
+            from stream_server import StreamServer
+
+            stream_server = StreamServer(port=self.stream_port, log=self.progress_log.append)
+            try:
+                stream_server.start()
+            except OSError as e:
+                self.progress_log.append(f"⚠️ Could not start the streaming server on port {self.stream_port}: {e}")
+                stream_server = None
+        self.worker = DownloadWorker(self.service, self.job_queue, self.max_concurrent_jobs,
+                                     self.max_concurrent_downloads, self.download_segments,
+                                     self.segment_threshold_mb * 1024 * 1024,
+                                     get_store() if self.use_content_store else None,
+                                     post_steps, self.sequential_downloads, stream_server,
+                                     self.settings.get("trace_file") or TRACE_FILE)
+        self.worker.progress_text.connect(self.progress_log.append)
+        self.worker.progress_value.connect(self.progress_bar.setValue)
+        self.worker.job_finished.connect(self.download_finished)
+        pending = len(self.job_queue.jobs([QUEUED]))
+        if pending:
+            self.progress_log.append(f"Resuming {pending} unfinished job(s)")
+        self.worker.start()
 
     def setup_ui(self):
         """Set up the main UI components"""
@@ -158,6 +255,13 @@ class MainWindow(QMainWindow):
         self.progress_bar.setValue(0)
         self.file_progress_bar = QProgressBar()
         self.file_progress_bar.setValue(0)
+        self.transfer_label = QLabel('')
+
+        # File progress and throughput are pulled from telemetry a few times a second
+        # instead of being pushed through a signal for every downloaded chunk
+        self.telemetry_timer = QTimer(self)
+        self.telemetry_timer.timeout.connect(self.update_transfer_stats)
+        self.telemetry_timer.start(1000 // UI_FPS)
 
         self.layout.addWidget(self.anime_label, 0, 0)
         self.layout.addWidget(self.anime_name, 1, 0)
@@ -165,6 +269,7 @@ class MainWindow(QMainWindow):
         self.layout.addWidget(self.progress_log, 2, 0, 1, 2)
         self.layout.addWidget(self.file_progress_bar, 3, 0, 1, 2)
         self.layout.addWidget(self.progress_bar, 4, 0, 1, 2)
+        self.layout.addWidget(self.transfer_label, 5, 0, 1, 2)
 
         self.widget = QWidget()
         self.widget.setLayout(self.layout)
@@ -173,24 +278,29 @@ class MainWindow(QMainWindow):
     def load_settings(self):
         """Load settings from settings.txt file"""
         try:
-            if os.path.exists("settings.txt"):
-                with open("settings.txt", "r") as file:
-                    settings = file.readlines()
-                for line in settings:
-                    line = line.strip()
-                    if line.startswith("auto_update_chromedriver="):
-                        value = line.split("=")[1].strip()
-                        self.auto_update_chromedriver = (value == "1")
-                        break
+            self.settings = read_settings()
         except Exception as e:
             print(f"Error loading settings: {e}")
-            self.auto_update_chromedriver = False
+            self.settings = {}
+        self.auto_update_chromedriver = self.settings.get("auto_update_chromedriver") == "1"
+        self.max_concurrent_downloads = get_int_setting(self.settings, "max_concurrent_downloads", 3)
+        self.download_segments = get_int_setting(self.settings, "download_segments", 4)
+        self.segment_threshold_mb = get_int_setting(self.settings, "segment_threshold_mb", SEGMENT_THRESHOLD_MB)
+        self.max_concurrent_jobs = get_int_setting(self.settings, "max_concurrent_jobs", 1)
+        self.use_content_store = self.settings.get("content_store") == "1"
+        self.sequential_downloads = self.settings.get("sequential_downloads") == "1"
+        self.stream_port = get_int_setting(self.settings, "stream_port", 8765)
+        configure_driver_pool(get_int_setting(self.settings, "webdriver_pool_size", 2))
+        enable_tracing(self.settings.get("tracing") == "1")
+        if self.settings.get("telemetry_file"):
+            get_telemetry().start_export(self.settings["telemetry_file"],
+                                         get_int_setting(self.settings, "telemetry_interval", 5))
 
     def save_settings(self):
         """Save settings to settings.txt file"""
         try:
-            with open("settings.txt", "w") as file:
-                file.write(f"auto_update_chromedriver={'1' if self.auto_update_chromedriver else '0'}\n")
+            self.settings["auto_update_chromedriver"] = '1' if self.auto_update_chromedriver else '0'
+            write_settings(self.settings)
         except Exception as e:
             print(f"Error saving settings: {e}")
 
@@ -209,9 +319,12 @@ class MainWindow(QMainWindow):
         clear_log_action.triggered.connect(self.clear_log)
         tools_menu.addAction(clear_log_action)
 
+        clear_search_cache_action = QAction("Clear Search Cache", self)
+        clear_search_cache_action.triggered.connect(self.clear_search_cache)
+        tools_menu.addAction(clear_search_cache_action)
+
         chromedriver_update_action = QAction("Update Chromedriver", self)
-        # Use lambda to ensure progress_log.append is available when called
-        chromedriver_update_action.triggered.connect(lambda: update_chromedriver(self.progress_log.append))
+        chromedriver_update_action.triggered.connect(self.update_chromedriver)
         tools_menu.addAction(chromedriver_update_action)
 
         # Create checkbox action for auto-update
@@ -236,11 +349,35 @@ class MainWindow(QMainWindow):
 
         # Auto-update immediately if enabled
         if self.auto_update_chromedriver:
-            update_chromedriver(self.progress_log.append)
+            self.update_chromedriver()
+
+    def closeEvent(self, event):
+        """Cancel running jobs and quit pooled browsers before the window goes away"""
+        if self.worker:
+            self.worker.stop()
+        shutdown_pools()
+        super().closeEvent(event)
+
+    def update_transfer_stats(self):
+        """Show the combined progress, throughput and ETA of the files downloading right now"""
+        snapshot = get_telemetry().snapshot()
+        if not snapshot['active_files']:
+            self.transfer_label.setText('')
+            return
+        self.file_progress_bar.setValue(snapshot['percent'])
+        self.transfer_label.setText(f"{snapshot['active_files']} file(s) · {format_rate(snapshot['bytes_per_second'])}"
+                                    f" · ETA {format_eta(snapshot['eta_seconds'])}")
 
     def clear_log(self):
         self.progress_log.clear()
 
+    def clear_search_cache(self):
+        """Forget cached kayoanime results so the next queries scrape the site again"""
+        from web_scraping import invalidate_search_cache
+
+        invalidate_search_cache()
+        self.progress_log.append("Search cache cleared")
+
     def show_about(self):
         about_box = QMessageBox(self)
         about_box.setWindowTitle("About cartoonspoon")
@@ -261,39 +398,15 @@ class MainWindow(QMainWindow):
             )
             return
         self.is_movie = True if self.query.endswith("-m") else False
-        self.anime_name.setDisabled(True)
-        self.scrape_button.setDisabled(True)
-        self.progress_log.append(f"Processing: {self.query}")
+        self.job_queue.enqueue(self.query)
+        self.progress_log.append(f"Queued: {self.query}")
+        self.anime_name.clear()
         self.progress_bar.setValue(0)
         self.file_progress_bar.setValue(0)
+        if self.worker:
+            self.worker.wake()
 
-        if "drive.google.com" in self.query or re.match(r"^[a-zA-Z0-9_-]{25,}$", self.query):
-            if re.match(r"^[a-zA-Z0-9_-]{25,}$", self.query):
-                drive_links = [["Direct Input", f"https://drive.google.com/drive/folders/{self.query}"]]
-            else:
-                drive_links = [["Direct Input", self.query]]
-        else:
-            drive_links = scrape_drive_links(self.query)
-
-        if not drive_links:
-            self.progress_log.append("No Google Drive links found.")
-            self.anime_name.setDisabled(False)
-            self.scrape_button.setDisabled(False)
-            return
-
-        for i, (name, url) in enumerate(drive_links):
-            self.progress_log.append(f"{i}: {name} -> {url}")
-
-        self.worker = DownloadWorker(self.service, drive_links, self.query)
-        self.worker.progress_text.connect(self.progress_log.append)
-        self.worker.progress_value.connect(self.progress_bar.setValue)
-        self.worker.file_progress.connect(self.file_progress_bar.setValue)
-        self.worker.finished.connect(self.download_finished)
-        self.worker.start()
-
-    def download_finished(self):
-        self.progress_log.append("All downloads finished!")
-        self.anime_name.setDisabled(False)
-        self.scrape_button.setDisabled(False)
+    def download_finished(self, query):
+        self.progress_log.append(f"All downloads finished for {query}!")
         self.progress_bar.setValue(100)
-        self.file_progress_bar.setValue(100)
\ No newline at end of file
+        self.file_progress_bar.setValue(100)
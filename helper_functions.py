@@ -1,7 +1,34 @@
+import os
 import re
 
+SETTINGS_FILE = "settings.txt"
+
 def sanitize_filename(name):
     name = re.sub(r'[<>:"/\\|?*]', '', name)            # remove invalid chars
     name = re.sub(r'\(\d+\.\s*\)', '', name)            # remove stray numbers in parentheses
     name = re.sub(r'\s+', ' ', name).strip()            # collapse spaces
-    return name
\ No newline at end of file
+    return name
+
+def read_settings(path=SETTINGS_FILE):
+    """Read key=value pairs from the settings file into a dict"""
+    settings = {}
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            for line in file:
+                line = line.strip()
+                if "=" in line and not line.startswith("#"):
+                    key, value = line.split("=", 1)
+                    settings[key.strip()] = value.strip()
+    return settings
+
+def write_settings(settings, path=SETTINGS_FILE):
+    """Write a dict of settings back as key=value lines"""
+    with open(path, "w") as file:
+        for key, value in settings.items():
+            file.write(f"{key}={value}\n")
+
+def get_int_setting(settings, key, default):
+    try:
+        return int(settings.get(key, default))
+    except (TypeError, ValueError):
+        return default
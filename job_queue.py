@@ -0,0 +1,170 @@
+import time
+import sqlite3
+import threading
+
+JOBS_DB = 'jobs.sqlite'
+MAX_ATTEMPTS = 3
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """
+    Durable queue of download jobs journaled in SQLite.
+    Jobs are claimed highest priority first (oldest first within a priority). A job
+    that fails goes back to the queue until it has used up its attempts, and jobs
+    still marked running from a previous session were interrupted by quitting, they are
+    requeued when the queue opens without using up an attempt.
+    """
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT NOT NULL, priority INTEGER DEFAULT 0, "
+                "state TEXT NOT NULL, attempts INTEGER DEFAULT 0, max_attempts INTEGER DEFAULT 3, "
+                "error TEXT, created_at REAL, updated_at REAL)"
+            )
+        self.recovered = self._recover()
+
+    def _recover(self):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), updated_at = ? WHERE state = ?",
+                (QUEUED, time.time(), RUNNING)
+            )
+            return cursor.rowcount
+
+    def enqueue(self, query, priority=0, max_attempts=MAX_ATTEMPTS):
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (query, priority, state, max_attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (query, priority, QUEUED, max_attempts, now, now)
+            )
+            return cursor.lastrowid
+
+    def claim_next(self):
+        """Mark the next queued job as running and return (id, query), or None if the queue is empty"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, query FROM jobs WHERE state = ? ORDER BY priority DESC, id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                               (RUNNING, time.time(), row[0]))
+            return row
+
+    def requeue(self, job_id):
+        """Put an interrupted job back in the queue without counting the attempt"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), updated_at = ? WHERE id = ?",
+                (QUEUED, time.time(), job_id)
+            )
+
+    def complete(self, job_id):
+        self._set_state(job_id, DONE, None)
+
+    def fail(self, job_id, error):
+        """Requeue the job if it has attempts left, otherwise mark it failed. Returns the new state"""
+        with self._lock:
+            attempts, max_attempts = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        state = QUEUED if attempts < max_attempts else FAILED
+        self._set_state(job_id, state, error)
+        return state
+
+    def _set_state(self, job_id, state, error):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?",
+                               (state, error, time.time(), job_id))
+
+    def jobs(self, states=None):
+        """List (id, query, priority, state, attempts, error) rows, optionally filtered by state"""
+        query = "SELECT id, query, priority, state, attempts, error FROM jobs"
+        params = ()
+        if states:
+            query += f" WHERE state IN ({', '.join('?' for _ in states)})"
+            params = tuple(states)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY priority DESC, id", params).fetchall()
+
+
+class JobScheduler:
+    """
+    Drains a JobQueue, running up to `max_jobs` jobs at once through `run_job(job_id, query)`.
+    run_job returns the list of per-file results; any failed file or exception counts
+    as a failed attempt.
+    """
+
+    def __init__(self, job_queue, run_job, max_jobs=1, poll_interval=5.0, log=print):
+        self.job_queue = job_queue
+        self.run_job = run_job
+        self.max_jobs = max(1, max_jobs)
+        self.poll_interval = poll_interval
+        self.log = log
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._running = 0
+
+    def wake(self):
+        """Call after enqueueing so the job starts without waiting for the next poll"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def run(self, until_empty=False):
+        """
+        Block draining the queue until stop(), or until it is empty when `until_empty` is set.
+        Jobs run on daemon threads so quitting never waits for a download; whatever was
+        interrupted stays marked running and is requeued on the next start.
+        """
+        while not self._stopped.is_set():
+            self._wake.clear()
+            while self._running < self.max_jobs and not self._stopped.is_set():
+                job = self.job_queue.claim_next()
+                if job is None:
+                    break
+                with self._lock:
+                    self._running += 1
+                threading.Thread(target=self._run, args=job, daemon=True).start()
+            with self._lock:
+                if until_empty and self._running == 0:
+                    break
+            self._wake.wait(self.poll_interval)
+
+    def _run(self, job_id, query):
+        try:
+            results = self.run_job(job_id, query) or []
+            if self._stopped.is_set():
+                self.job_queue.requeue(job_id)
+                return
+            failed = [result for result in results if result.get('status') == 'failed']
+            if failed:
+                state = self.job_queue.fail(job_id, f"{len(failed)} file(s) failed")
+                self.log(f"⚠️ {len(failed)} file(s) failed for '{query}', job {state}")
+            else:
+                self.job_queue.complete(job_id)
+        except Exception as e:
+            if self._stopped.is_set():
+                self.job_queue.requeue(job_id)
+                return
+            state = self.job_queue.fail(job_id, str(e))
+            self.log(f"❌ Job for '{query}' failed ({e}), job {state}")
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._wake.set()
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+MANIFEST_PATH = os.path.join("downloads", ".manifest.json")
+SAVE_INTERVAL = 2.0
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class ManifestIndex:
+    """
+    Persistent index of downloaded Drive files:
+    file_id -> planned path -> local path, size, md5Checksum, modifiedTime and the local mtime
+    seen at record time. One Drive file can be wanted in several places (a season folder and a
+    "complete" folder), each copy gets its own entry.
+    Lets a re-run skip files that are already on disk and unchanged on Drive.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        for file_id, entry in self.entries.items():
+            if "path" in entry:  # written when there was one entry per file_id
+                self.entries[file_id] = {entry.get("source_path") or entry["path"]: entry}
+
+    def is_current(self, file_id, local_path, size=None, md5=None, modified_time=None):
+        """
+        True if local_path already holds this Drive file.
+        A size/mtime comparison against the index is tried first, the local md5 is
+        only computed when the index has no matching entry but the sizes agree.
+        """
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return False
+        if size is not None and stat.st_size != size:
+            return False
+
+        with self._lock:
+            entry = next((entry for entry in self.entries.get(file_id, {}).values() if entry["path"] == local_path), None)
+        if (entry and entry["size"] == stat.st_size
+                and entry["mtime"] == stat.st_mtime
+                and (md5 is None or entry.get("md5Checksum") in (None, md5))
+                and (modified_time is None or entry.get("modifiedTime") == modified_time)):
+            return True
+
+        if md5 and file_md5(local_path) == md5:
+            self.record(file_id, local_path, md5, modified_time)
+            return True
+        return False
+
+    def resolve_path(self, file_id, local_path):
+        """Where a file planned for local_path actually lives, following renames done after download"""
+        with self._lock:
+            entry = self.entries.get(file_id, {}).get(local_path)
+        return entry["path"] if entry else local_path
+
+    def record(self, file_id, local_path, md5=None, modified_time=None, source_path=None):
+        """Index a file on disk, `source_path` being where downloads plan it if it was moved since"""
+        stat = os.stat(local_path)
+        with self._lock:
+            copies = self.entries.setdefault(file_id, {})
+            if source_path is None:
+                source_path = next((planned for planned, entry in copies.items() if entry["path"] == local_path),
+                                   local_path)
+            copies[source_path] = {
+                "path": local_path,
+                "size": stat.st_size,
+                "md5Checksum": md5,
+                "modifiedTime": modified_time,
+                "mtime": stat.st_mtime,
+            }
+            if source_path != local_path:
+                copies[source_path]["source_path"] = source_path
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.entries)
+            self._dirty = False
+            self._last_save = time.monotonic()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+
+def get_manifest():
+    """Process-wide index, so concurrent jobs never overwrite each other's entries"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ManifestIndex()
+        return _shared
+
+
+def file_md5(path, block_size=8 * 1024 * 1024):
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            md5.update(block)
+    return md5.hexdigest()
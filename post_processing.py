@@ -0,0 +1,136 @@
+import os
+import errno
+import shutil
+import threading
+from xml.sax.saxutils import escape
+from concurrent.futures import ThreadPoolExecutor
+
+from manifest import get_manifest
+from tracing import span
+
+VIDEO_EXTENSIONS = {".mkv", ".mp4", ".avi", ".m4v", ".mov", ".webm", ".ts"}
+DEFAULT_STEPS = "rename_movie,write_nfo"
+
+
+class PostProcessor:
+    """
+    Runs post-download steps on completed files with its own executor, so downloads
+    never wait on them. Each step takes the item dict (file_id, path, md5, modified_time,
+    kind, root, title, year, tmdb_id) and returns it, updated if it moved the file.
+    A failing step is logged and ends processing of that item.
+    """
+
+    def __init__(self, steps=None, max_workers=1, log=print):
+        self.steps = list(steps if steps is not None else resolve_steps(DEFAULT_STEPS))
+        self.log = log
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="post")
+
+    def submit(self, item):
+        if not self.steps:
+            return None
+        try:
+            return self._executor.submit(self._process, item)
+        except RuntimeError:  # shut down while a job was still finishing files
+            self.log(f"⚠️ Post-processing has stopped, skipped {os.path.basename(item['path'])}")
+            return None
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if wait:
+            get_manifest().save()
+
+    def _process(self, item):
+        for step in self.steps:
+            try:
+                with span(f"post.{step.__name__}", 'post'):
+                    item = step(item)
+            except Exception as e:
+                self.log(f"⚠️ Post-processing step {step.__name__} failed for {os.path.basename(item['path'])}: {e}")
+                break
+        return item
+
+
+def move_file(source, target):
+    """Atomic rename within a filesystem, a plain move across filesystems"""
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source, target)
+
+
+def rename_movie(item):
+    """
+    Give a movie the name of its folder ("Title (year) [tmdbid-N].mkv") if it is the largest
+    video there, so trailers and samples keep their names. Folders with downloads still in
+    progress are left alone.
+    """
+    if item.get("kind") != "movie" or os.path.dirname(item["path"]) != item["root"]:
+        return item
+    ext = os.path.splitext(item["path"])[1].lower()
+    if ext not in VIDEO_EXTENSIONS:
+        return item
+    names = os.listdir(item["root"])
+    if any(name.endswith(".part") for name in names):
+        return item
+    videos = [os.path.join(item["root"], name) for name in names
+              if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS]
+    target = os.path.join(item["root"], os.path.basename(item["root"]) + ext)
+    if os.path.exists(target) or max(videos, key=os.path.getsize) != item["path"]:
+        return item
+
+    move_file(item["path"], target)
+    # Remember where the file came from so the next run still sees it as downloaded
+    get_manifest().record(item["file_id"], target, item.get("md5"), item.get("modified_time"),
+                          source_path=item["path"])
+    return dict(item, path=target)
+
+
+def write_nfo(item):
+    """Write movie.nfo / tvshow.nfo with the TMDB id next to the library entry, once"""
+    if item.get("kind") not in ("movie", "episode") or item.get("tmdb_id") in (None, "unknown"):
+        return item
+    tag = "movie" if item["kind"] == "movie" else "tvshow"
+    nfo_path = os.path.join(item["root"], f"{tag}.nfo")
+    if os.path.exists(nfo_path):
+        return item
+
+    content = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f"<{tag}>\n"
+        f"  <title>{escape(item['title'])}</title>\n"
+        f"  <year>{escape(item['year'])}</year>\n"
+        f'  <uniqueid type="tmdb" default="true">{escape(item["tmdb_id"])}</uniqueid>\n'
+        f"</{tag}>\n"
+    )
+    tmp_path = f"{nfo_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, nfo_path)
+    return item
+
+
+STEPS = {
+    "rename_movie": rename_movie,
+    "write_nfo": write_nfo,
+}
+
+
+def register_step(name, step):
+    """Make a custom step available to the post_processing_steps setting"""
+    STEPS[name] = step
+
+
+def resolve_steps(names):
+    """Turn a comma separated list of step names (the post_processing_steps setting) into callables"""
+    steps = []
+    for name in (names or "").split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in STEPS:
+            raise ValueError(f"Unknown post-processing step: {name}")
+        steps.append(STEPS[name])
+    return steps
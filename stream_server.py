@@ -0,0 +1,145 @@
+import os
+import re
+import time
+import threading
+import mimetypes
+from urllib.parse import quote, unquote, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google_drive import get_part_state
+
+STREAM_PORT = 8765
+READ_SIZE = 1024 * 1024
+WAIT_TIMEOUT = 30
+
+
+class StreamServer:
+    """
+    Local HTTP server with Range support for files under downloads/, including ones still
+    downloading. Reads of bytes that are not on disk yet block until the download writes
+    them (up to WAIT_TIMEOUT seconds), so a player can start on an episode that is being
+    fetched in sequential mode. The wait before the first byte of the first request for
+    a downloading file is logged as its time-to-first-frame.
+    """
+
+    def __init__(self, root="downloads", host="127.0.0.1", port=STREAM_PORT, log=print):
+        self.root = os.path.realpath(root)
+        self.host = host
+        self.port = port
+        self.log = log
+        self.first_frame_times = {}  # file name -> seconds from the first request to its first byte
+        self._httpd = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        handler = type("Handler", (_StreamHandler,), {"stream": self})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        self.log(f"▶️ Streaming server on http://{self.host}:{self.port}/")
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def url_for(self, path):
+        relative = os.path.relpath(os.path.realpath(path), self.root).replace(os.sep, "/")
+        return f"http://{self.host}:{self.port}/{quote(relative)}"
+
+    def record_first_frame(self, name, seconds, since_download_start=None):
+        with self._lock:
+            if name in self.first_frame_times:
+                return
+            self.first_frame_times[name] = seconds
+        started = f", {since_download_start:.1f}s after its download started" if since_download_start is not None else ""
+        self.log(f"⏱️ First bytes of {name} served {seconds:.2f}s after the request{started}")
+
+    def resolve(self, url_path):
+        """Map a request path to a file under root, None for anything outside it"""
+        path = os.path.realpath(os.path.join(self.root, unquote(urlparse(url_path).path).lstrip("/")))
+        if os.path.commonpath([path, self.root]) != self.root:
+            return None
+        return path
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    stream = None
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _serve(self, body):
+        requested_at = time.monotonic()
+        target = self.stream.resolve(self.path)
+        state = get_part_state(target) if target else None
+        if state is not None:
+            size = state.size
+        elif target and os.path.isfile(target):
+            size = os.path.getsize(target)
+        else:
+            self.send_error(404)
+            return
+
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end or start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", mimetypes.guess_type(target)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+
+        offset, first = start, True
+        try:
+            while offset <= end:
+                length = min(READ_SIZE, end + 1 - offset)
+                data = _read(target, state, offset, length)
+                if not data:
+                    return  # the download stalled or stopped, the player will retry the range
+                if first and state is not None:
+                    first = False
+                    self.stream.record_first_frame(os.path.basename(target), time.monotonic() - requested_at,
+                                                   time.time() - state.started_at)
+                self.wfile.write(data)
+                offset += len(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # players close connections all the time when seeking
+
+
+def _read(target, state, offset, length):
+    """Read from the part file while it is downloading, from the target once it is finished"""
+    paths = (target,)
+    if state is not None and state.wait_for(offset, offset + length, WAIT_TIMEOUT):
+        paths = (target + ".part", target)
+    for path in paths:
+        try:
+            with open(path, "rb") as fh:
+                fh.seek(offset)
+                return fh.read(length)
+        except FileNotFoundError:
+            continue  # renamed onto the target between the check and the open
+    return b""
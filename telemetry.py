@@ -0,0 +1,159 @@
+import sys
+import json
+import time
+import threading
+from collections import deque
+
+RATE_WINDOW = 5.0
+EXPORT_INTERVAL = 5.0
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class _Rate:
+    """Moving average of a growing byte counter over the last `window` seconds"""
+
+    def __init__(self, window):
+        self.window = window
+        self._samples = deque()  # (monotonic time, counter)
+
+    def update(self, now, counter):
+        self._samples.append((now, counter))
+        self._prune(now)
+
+    def value(self, now):
+        self._prune(now)
+        if not self._samples:
+            return 0.0
+        first_time, first = self._samples[0]
+        last = self._samples[-1][1]
+        return (last - first) / (now - first_time) if now > first_time else 0.0
+
+    def _prune(self, now):
+        while len(self._samples) > 1 and self._samples[1][0] < now - self.window:
+            self._samples.popleft()
+        if len(self._samples) == 1 and self._samples[0][0] < now - self.window:
+            self._samples.clear()
+
+
+class TransferTelemetry:
+    """
+    Byte counters, moving-average throughput and ETA for every file in flight plus the total.
+    Downloads only add bytes; readers (the GUI timer, the JSON-lines exporter) pull snapshots
+    at their own pace, so progress never costs more than one call per chunk.
+    """
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._files = {}  # key -> {'name', 'size', 'done', 'received', 'rate'}
+        self._total_bytes = 0  # bytes received this session
+        self._completed_files = 0
+        self._total_rate = _Rate(window)
+        self._exporter = None
+
+    def start_file(self, key, name, size, done=0):
+        """`done` is what an earlier run already left on disk, it does not count as throughput"""
+        now = time.monotonic()
+        rate = _Rate(self.window)
+        rate.update(now, 0)
+        with self._lock:
+            self._files[key] = {'name': name, 'size': size, 'done': done, 'received': 0, 'rate': rate}
+            self._total_rate.update(now, self._total_bytes)
+
+    def add_bytes(self, key, count, done=None):
+        """Count `count` newly received bytes, `done` being the file's bytes on disk when known"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is None:
+                return
+            entry['done'] = entry['done'] + count if done is None else done
+            entry['received'] += count
+            entry['rate'].update(now, entry['received'])
+            self._total_bytes += count
+            self._total_rate.update(now, self._total_bytes)
+
+    def finish_file(self, key):
+        with self._lock:
+            if self._files.pop(key, None) is not None:
+                self._completed_files += 1
+
+    def snapshot(self):
+        """Plain dict of the current state, ready for json.dumps"""
+        now = time.monotonic()
+        with self._lock:
+            files = []
+            for entry in self._files.values():
+                rate = entry['rate'].value(now)
+                remaining = max(0, entry['size'] - entry['done'])
+                files.append({
+                    'name': entry['name'],
+                    'bytes': entry['done'],
+                    'size': entry['size'],
+                    'percent': int(entry['done'] / entry['size'] * 100) if entry['size'] else 100,
+                    'bytes_per_second': round(rate),
+                    'eta_seconds': round(remaining / rate) if rate else None,
+                })
+            total_rate = self._total_rate.value(now)
+            done = sum(file['bytes'] for file in files)
+            size = sum(file['size'] for file in files)
+            return {
+                'time': round(time.time(), 3),
+                'active_files': len(files),
+                'completed_files': self._completed_files,
+                'session_bytes': self._total_bytes,
+                'bytes': done,
+                'size': size,
+                'percent': int(done / size * 100) if size else 0,
+                'bytes_per_second': round(total_rate),
+                'eta_seconds': round((size - done) / total_rate) if total_rate and files else None,
+                'files': files,
+            }
+
+    def start_export(self, path, interval=EXPORT_INTERVAL):
+        """Append a JSON-lines snapshot to `path` every `interval` seconds while anything is moving"""
+        if self._exporter is not None:
+            return
+        self._exporter = threading.Thread(target=self._export, args=(path, interval), daemon=True)
+        self._exporter.start()
+
+    def _export(self, path, interval):
+        last_bytes = None
+        while True:
+            time.sleep(interval)
+            snapshot = self.snapshot()
+            if not snapshot['active_files'] and snapshot['session_bytes'] == last_bytes:
+                continue
+            last_bytes = snapshot['session_bytes']
+            try:
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(snapshot) + '\n')
+            except OSError as e:
+                print(f"[WARN] Could not write telemetry to {path}: {e}", file=sys.stderr)
+
+
+def get_telemetry():
+    """Process-wide telemetry, so concurrent jobs add up to one total"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = TransferTelemetry()
+        return _shared
+
+
+def format_rate(bytes_per_second):
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if bytes_per_second < 1024:
+            return f"{bytes_per_second:.1f} {unit}"
+        bytes_per_second /= 1024
+    return f"{bytes_per_second:.1f} GB/s"
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
@@ -0,0 +1,42 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import types
+import importlib
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _selenium_stubs():
+    """Just enough of selenium for web_scraping to import, for tests that never open a browser"""
+    exceptions = types.ModuleType("selenium.common.exceptions")
+    for name in ("StaleElementReferenceException", "ElementClickInterceptedException", "TimeoutException"):
+        setattr(exceptions, name, type(name, (Exception,), {}))
+    modules = {name: types.ModuleType(name) for name in (
+        "selenium", "selenium.webdriver", "selenium.webdriver.common", "selenium.webdriver.common.by",
+        "selenium.webdriver.common.keys", "selenium.webdriver.support", "selenium.webdriver.support.ui",
+        "selenium.webdriver.support.expected_conditions", "selenium.common")}
+    modules["selenium.common.exceptions"] = exceptions
+    modules["selenium.webdriver.common.by"].By = type("By", (), {})
+    modules["selenium.webdriver.common.keys"].Keys = type("Keys", (), {})
+    modules["selenium.webdriver.support.ui"].WebDriverWait = object
+    return modules
+
+
+@pytest.fixture
+def web_scraping(monkeypatch):
+    """web_scraping imported with selenium stubbed when it is not installed"""
+    pytest.importorskip("requests")
+    try:
+        importlib.import_module("selenium.webdriver")
+    except ImportError:
+        for name, module in _selenium_stubs().items():
+            monkeypatch.setitem(sys.modules, name, module)
+        monkeypatch.delitem(sys.modules, "web_scraping", raising=False)
+    return importlib.import_module("web_scraping")
@@ -0,0 +1,52 @@
+import os
+import time
+import pathlib
+
+import pytest
+
+from conftest import FIXTURES
+
+ROUNDS = 5
+
+
+@pytest.fixture(scope="module")
+def driver():
+    webdriver = pytest.importorskip("selenium.webdriver")
+    from selenium.common.exceptions import WebDriverException
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    try:
+        driver = webdriver.Chrome(options=options)
+    except WebDriverException as e:
+        pytest.skip(f"Chrome is not available: {e.msg}")
+    driver.get(pathlib.Path(os.path.join(FIXTURES, "drive_links.html")).as_uri())
+    yield driver
+    driver.quit()
+
+
+def _per_anchor(driver):
+    """How links were read before DRIVE_LINKS_SCRIPT: two WebDriver round trips per anchor"""
+    from selenium.webdriver.common.by import By
+
+    return [[anchor.text.strip() or "(no text)", anchor.get_attribute("href")]
+            for anchor in driver.find_elements(By.CSS_SELECTOR, 'a[href*="drive.google.com"]')]
+
+
+def _best_of(function, *args):
+    best, result = float("inf"), None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def test_single_script_beats_per_anchor_reads(driver, web_scraping):
+    script_time, script = _best_of(lambda: driver.execute_script(web_scraping.DRIVE_LINKS_SCRIPT)["links"])
+    anchor_time, anchors = _best_of(_per_anchor, driver)
+    print(f"\n{len(script)} links: execute_script {script_time * 1000:.1f} ms, "
+          f"get_attribute per anchor {anchor_time * 1000:.1f} ms ({anchor_time / script_time:.0f}x)")
+    assert len(script) == 301
+    assert script == anchors
+    assert script_time < anchor_time
@@ -0,0 +1,36 @@
+import driver_pool
+from driver_pool import DriverPool
+
+
+class DeadDriver:
+    """A session whose chromedriver process died: every call fails below selenium"""
+
+    def __init__(self):
+        self.quit_calls = 0
+
+    @property
+    def current_url(self):
+        raise ConnectionRefusedError("chromedriver is gone")
+
+    def get(self, url):
+        raise ConnectionRefusedError("chromedriver is gone")
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+def test_dead_session_is_recycled_without_hiding_the_result(monkeypatch):
+    dead, fresh = DeadDriver(), object()
+    created = iter([dead, fresh])
+    monkeypatch.setattr(DriverPool, "_create", lambda self: next(created))
+    pool = DriverPool(size=1)
+
+    with pool.driver() as driver:
+        result = driver
+    assert result is dead
+    assert dead.quit_calls == 1
+
+    pool._idle.append([dead, driver_pool.time.time(), 0])
+    with pool.driver() as driver:
+        assert driver is fresh
+    assert dead.quit_calls == 2
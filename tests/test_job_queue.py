@@ -0,0 +1,15 @@
+from job_queue import JobQueue, QUEUED
+
+
+def test_jobs_interrupted_by_quitting_keep_their_attempts(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    job_id = JobQueue(path).enqueue("one piece")
+    for _ in range(5):  # the app is closed during the download every time
+        queue = JobQueue(path)
+        assert queue.claim_next() == (job_id, "one piece")
+
+    queue = JobQueue(path)
+    assert queue.recovered == 1
+    assert queue.jobs() == [(job_id, "one piece", 0, QUEUED, 0, None)]
+    queue.claim_next()
+    assert queue.fail(job_id, "network") == QUEUED
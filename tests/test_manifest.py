@@ -0,0 +1,59 @@
+import os
+import json
+
+import manifest
+from manifest import ManifestIndex
+
+MD5 = "5d41402abc4b2a76b9719d911017c592"  # md5 of b"hello"
+
+
+def _write(path, data=b"hello"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_copies_of_one_file_keep_separate_entries(tmp_path, monkeypatch):
+    season = _write(tmp_path / "Show" / "Season 1" / "e01.mkv")
+    complete = str(tmp_path / "Show" / "Complete" / "e01.mkv")
+    os.makedirs(os.path.dirname(complete))
+    os.link(season, complete)
+    index = ManifestIndex(str(tmp_path / "manifest.json"))
+    index.record("id1", season, MD5)
+    index.record("id1", complete, MD5)
+    index.save()
+
+    hashed = []
+    monkeypatch.setattr(manifest, "file_md5", lambda path: hashed.append(path) or MD5)
+    reloaded = ManifestIndex(str(tmp_path / "manifest.json"))
+    assert reloaded.is_current("id1", season, 5, MD5)
+    assert reloaded.is_current("id1", complete, 5, MD5)
+    assert hashed == []
+
+
+def test_moved_file_resolves_from_its_planned_path(tmp_path):
+    planned = _write(tmp_path / "Movie" / "movie.mkv")
+    index = ManifestIndex(str(tmp_path / "manifest.json"))
+    index.record("id1", planned, MD5)
+    renamed = str(tmp_path / "Movie" / "Movie (2001).mkv")
+    os.replace(planned, renamed)
+    index.record("id1", renamed, MD5, source_path=planned)
+    index.record("id1", renamed, MD5)  # a later re-verification keeps the planned path
+
+    assert index.resolve_path("id1", planned) == renamed
+    assert index.is_current("id1", renamed, 5, MD5)
+    assert list(index.entries["id1"]) == [planned]
+
+
+def test_reads_one_entry_per_file_manifests(tmp_path):
+    path = _write(tmp_path / "a.mkv")
+    planned = str(tmp_path / "planned.mkv")
+    stat = os.stat(path)
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump({"id1": {"path": path, "size": stat.st_size, "md5Checksum": MD5, "modifiedTime": None,
+                           "mtime": stat.st_mtime, "source_path": planned}}, f)
+
+    index = ManifestIndex(str(tmp_path / "manifest.json"))
+    assert index.resolve_path("id1", planned) == path
+    assert index.is_current("id1", path, 5, MD5)
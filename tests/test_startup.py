@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAINT_BUDGET = 0.8  # seconds from `import gui` to the first paint of the main window
+
+# Runs in a fresh interpreter so nothing imported by other tests hides a slow import.
+# googleapiclient and selenium are replaced by a finder that records any attempt to load them,
+# and the auth and chromedriver workers do nothing, since both run after the window is up.
+SCRIPT = r"""
+import sys, json, time, importlib.abc
+
+HEAVY = ("googleapiclient", "selenium")
+attempted = []
+
+class Block(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in HEAVY:
+            attempted.append(name)
+            raise ImportError(f"{name} must not be imported at GUI startup")
+        return None
+
+sys.meta_path.insert(0, Block())
+from PySide6.QtCore import QObject, QEvent
+from PySide6.QtWidgets import QApplication
+
+app = QApplication([])
+painted = []
+
+class PaintWatcher(QObject):
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and not painted:
+            painted.append(time.perf_counter())
+        return False
+
+start = time.perf_counter()
+import gui
+gui.AuthWorker.run = lambda self: None
+gui.ChromedriverWorker.run = lambda self: None
+window = gui.MainWindow()
+watcher = PaintWatcher()
+window.installEventFilter(watcher)
+window.show()
+deadline = time.perf_counter() + 5
+while not painted and time.perf_counter() < deadline:
+    app.processEvents()
+window.close()
+window.auth_worker.wait()
+print(json.dumps({
+    "elapsed": painted[0] - start if painted else None,
+    "attempted": attempted,
+    "loaded": sorted(name for name in sys.modules if name.split(".")[0] in HEAVY),
+}))
+"""
+
+
+def test_window_paints_quickly_without_heavy_modules(tmp_path):
+    pytest.importorskip("PySide6")
+    shutil.copy(os.path.join(ROOT, "settings.txt"), tmp_path)  # the job queue and settings live in the cwd
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen",
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, "-c", SCRIPT], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["attempted"] == []
+    assert report["loaded"] == []
+    assert report["elapsed"] is not None, "the window was never painted"
+    assert report["elapsed"] < PAINT_BUDGET
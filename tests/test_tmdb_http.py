@@ -0,0 +1,69 @@
+import os
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import FIXTURES
+
+# Saved TMDB pages, trimmed to the parts _resolve_tmdb_http reads
+ROUTES = {
+    "/search/tv": "tmdb_search_tv.html",
+    "/tv/45790-jojo-s-bizarre-adventure": "tmdb_detail_tv.html",
+    "/search/movie": "tmdb_search_movie.html",
+    "/movie/129-sen-to-chihiro-no-kamikakushi": "tmdb_detail_movie.html",
+}
+NO_RESULTS = "no results"
+BROKEN = "broken"
+
+
+class _TmdbHandler(SimpleHTTPRequestHandler):
+    def translate_path(self, path):
+        url = urlparse(path)
+        query = parse_qs(url.query).get("query")
+        if query == [NO_RESULTS]:
+            return os.path.join(FIXTURES, "tmdb_search_empty.html")
+        if query == [BROKEN]:
+            return os.path.join(FIXTURES, "tmdb_detail_movie.html")  # no search results markup at all
+        return os.path.join(FIXTURES, ROUTES.get(url.path, "missing.html"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def tmdb_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TmdbHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def resolve(web_scraping, monkeypatch):
+    monkeypatch.delenv("TMDB_API_KEY", raising=False)
+    monkeypatch.setattr(web_scraping, "read_settings", lambda: {})
+    return web_scraping._resolve_tmdb_http
+
+
+def test_tv_title_year_and_id(resolve, tmdb_url):
+    assert resolve("jojo", "tv", base_url=tmdb_url) == ("JoJo's Bizarre Adventure", "2012", "45790")
+
+
+def test_movie_title_year_and_id(resolve, tmdb_url):
+    assert resolve("spirited away", "movie", base_url=tmdb_url) == ("Spirited Away", "2001", "129")
+
+
+def test_no_results_is_unknown_without_a_browser(resolve, tmdb_url):
+    assert resolve(NO_RESULTS, "tv", base_url=tmdb_url) == (NO_RESULTS, "0000", "unknown")
+
+
+def test_unparseable_page_falls_back(resolve, tmdb_url):
+    assert resolve(BROKEN, "tv", base_url=tmdb_url) is None
+
+
+def test_unknown_page_raises_for_status(resolve, tmdb_url, web_scraping):
+    with pytest.raises(web_scraping.requests.HTTPError):
+        resolve("jojo", "movie", base_url=tmdb_url + "/gone")
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+
+_enabled = False
+_events = []  # Chrome trace "complete" events
+_lock = threading.Lock()
+_origin = time.perf_counter()
+_NOOP = nullcontext()
+
+
+class _Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        event = {
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': round((self.start - _origin) * 1e6, 1),
+            'dur': round((end - self.start) * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': self.args,
+        }
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def enable(enabled=True):
+    """Turn span recording on or off for the whole process"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, category='phase', **args):
+    """
+    Time a block as a trace span: `with span('download', file=name): ...`.
+    While tracing is off this returns a shared no-op context, so instrumented code
+    only pays for one function call.
+    """
+    if not _enabled:
+        return _NOOP
+    return _Span(name, category, args)
+
+
+def reset():
+    with _lock:
+        _events.clear()
+
+
+def export_chrome_trace(path):
+    """Write every recorded span as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+    with _lock:
+        data = json.dumps({'traceEvents': list(_events), 'displayTimeUnit': 'ms'})
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def summary():
+    """Per span name: (category, count, total seconds, mean seconds, max seconds), slowest total first"""
+    totals = {}
+    with _lock:
+        for event in _events:
+            entry = totals.setdefault(event['name'], [event['cat'], 0, 0.0, 0.0])
+            entry[1] += 1
+            entry[2] += event['dur'] / 1e6
+            entry[3] = max(entry[3], event['dur'] / 1e6)
+    rows = [(name, cat, count, total, total / count, longest) for name, (cat, count, total, longest) in totals.items()]
+    return sorted(rows, key=lambda row: row[3], reverse=True)
+
+
+def format_summary():
+    """Plain-text table of summary(), for logs and stderr"""
+    rows = summary()
+    if not rows:
+        return "No trace spans recorded."
+    width = max(len("span"), *(len(row[0]) for row in rows))
+    lines = [f"{'span':<{width}}  {'kind':<9} {'count':>6} {'total s':>9} {'mean s':>8} {'max s':>8}"]
+    for name, cat, count, total, mean, longest in rows:
+        lines.append(f"{name:<{width}}  {cat:<9} {count:>6} {total:>9.3f} {mean:>8.3f} {longest:>8.3f}")
+    return "\n".join(lines)
@@ -1,45 +1,218 @@
+import os
 import re
+import sys
+import html
 import time
+import threading
 
-from selenium import webdriver
+import requests
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as ec
-from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.common.exceptions import StaleElementReferenceException, ElementClickInterceptedException, TimeoutException
+
+from cache import SqliteCache
+from tracing import span
+from driver_pool import get_pool
+from helper_functions import read_settings, get_int_setting
+
+TMDB_CACHE_TTL = 30 * 24 * 3600
+TMDB_NEGATIVE_TTL = 24 * 3600
+SEARCH_CACHE_TTL = 3 * 24 * 3600
+SEARCH_STALE_WINDOW = 30 * 24 * 3600  # expired search results are still served (and refreshed) this long
+TMDB_PATTERNS = {
+    "tv": (r"/tv/(\d+)", r"^(.*?)\s*\(TV Series (\d{4})"),
+    "movie": (r"/movie/(\d+)", r"^(.*?)\s*\((\d{4})"),
+}
+TMDB_NO_RESULTS = r"There are no (?:TV shows|movies) that matched your query"
+SCRAPE_RETRIES = 3
+# Returns every Drive link on the page in one round trip, or null until the page has loaded
+DRIVE_LINKS_SCRIPT = """
+if (document.readyState !== 'complete') return null;
+const links = [];
+for (const a of document.querySelectorAll('a[href*="drive.google.com"]')) {
+    links.push([(a.innerText || '').trim() || '(no text)', a.href]);
+}
+return {links: links};
+"""
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+_tmdb_cache = None
+_search_cache = None
+_caches_lock = threading.Lock()  # resolver and scheduler threads reach the caches at the same time
+_revalidating = set()  # search cache keys being refreshed in the background
+_revalidating_lock = threading.Lock()
+_http = requests.Session()
+_http.headers.update(HTTP_HEADERS)
+
+def _get_tmdb_cache():
+    global _tmdb_cache
+    with _caches_lock:
+        if _tmdb_cache is None:
+            _tmdb_cache = SqliteCache("tmdb", TMDB_CACHE_TTL)
+        return _tmdb_cache
+
+def _get_search_cache():
+    global _search_cache
+    with _caches_lock:
+        if _search_cache is None:
+            _search_cache = SqliteCache("kayoanime", SEARCH_CACHE_TTL, stale_window=SEARCH_STALE_WINDOW)
+        return _search_cache
+
+def _search_key(query):
+    return ' '.join(query.lower().split())
+
+def search_drive_links(query, headless=False, refresh=False):
+    """
+    Return the [text, href] Drive links for a query, served from the search cache when possible.
+    An expired entry is returned immediately while a headless browser refreshes it in the
+    background. Empty results are never cached, since they usually mean the scrape failed.
+    `refresh` skips the cache and overwrites it.
+    """
+    key = _search_key(query)
+    cache = _get_search_cache()
+    entry = None if refresh else cache.get_entry(key)
+    if entry is not None:
+        if entry[2] < time.time():
+            _revalidate_search(query, key)
+        return entry[0]
+
+    links = scrape_drive_links(query, headless=headless)
+    if links:
+        cache.set(key, links)
+    return links
+
+def _revalidate_search(query, key):
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def refresh():
+        try:
+            links = scrape_drive_links(query, headless=True)
+            if links:
+                _get_search_cache().set(key, links)
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+def invalidate_search_cache(query=None):
+    """Forget the cached links of one query, or of every query when none is given"""
+    if query is None:
+        _get_search_cache().clear()
+    else:
+        _get_search_cache().delete(_search_key(query))
 
 def scrape_tmdb_info(query, content_type="tv"):
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--window-size=1400,900")
-    driver = webdriver.Chrome(options=options)
-    wait = WebDriverWait(driver, 10)
+    """
+    Return (title, year, tmdb_id) for a query, served from the TMDB cache when possible.
+    "unknown" results are cached for a shorter time, failed scrapes are not cached at all.
+    """
+    key = f"{content_type}:{' '.join(query.lower().split())}"
+    cache = _get_tmdb_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
 
     try:
-        if content_type == "tv":
-            search_url = f"https://www.themoviedb.org/search/tv?query={query.replace(' ', '+')}"
-            id_pattern = r"/tv/(\d+)"
-            year_pattern = r"^(.*?)\s*\(TV Series (\d{4})"
-        else:
-            search_url = f"https://www.themoviedb.org/search/movie?query={query.replace(' ', '+')}"
-            id_pattern = r"/movie/(\d+)"
-            year_pattern = r"^(.*?)\s*\((\d{4})"
+        with span('tmdb.http', 'http', query=query):
+            result = _resolve_tmdb_http(query, content_type)
+    except (requests.RequestException, ValueError, KeyError) as e:
+        print(f"[WARN] TMDB HTTP lookup failed for '{query}', falling back to the browser: {e}", file=sys.stderr)
+        result = None
+
+    try:
+        if result is None:
+            with span('tmdb.browser', 'webdriver', query=query):
+                result = _scrape_tmdb_info(query, content_type)
+    except Exception as e:
+        print(f"[ERROR] TMDB scrape failed for '{query}': {e}", file=sys.stderr)
+        return query, "0000", "unknown"
+
+    cache.set(key, list(result), ttl=TMDB_NEGATIVE_TTL if result[2] == "unknown" else None)
+    return result
 
-        driver.get(search_url)
+def _resolve_tmdb_http(query, content_type="tv", base_url="https://www.themoviedb.org"):
+    """
+    Resolve (title, year, tmdb_id) without a browser.
+    Uses the TMDB JSON API when a key is configured, otherwise the search and
+    detail pages, which are rendered server side. A search without hits gives
+    (query, "0000", "unknown"), like the browser scrape. Returns None when the
+    HTML could not be understood so the caller can fall back to Selenium.
+    """
+    api_key = os.environ.get("TMDB_API_KEY") or read_settings().get("tmdb_api_key")
+    if api_key:
+        return _resolve_tmdb_api(query, content_type, api_key)
+
+    id_pattern, year_pattern = TMDB_PATTERNS[content_type]
+    response = _http.get(f"{base_url}/search/{content_type}", params={"query": query}, timeout=10)
+    response.raise_for_status()
+    link_match = re.search(rf'class="result"[^>]*href="(/{content_type}/\d+[^"]*)"', response.text) \
+        or re.search(rf'href="(/{content_type}/\d+[^"]*)"', response.text)
+    if not link_match:
+        return (query, "0000", "unknown") if re.search(TMDB_NO_RESULTS, response.text) else None
+
+    first_link = base_url + html.unescape(link_match.group(1))
+    response = _http.get(first_link, timeout=10)
+    response.raise_for_status()
+    title_match = re.search(r"<title>(.*?)</title>", response.text, re.DOTALL)
+    if not title_match:
+        return None
+
+    full_title = html.unescape(title_match.group(1)).strip()
+    match = re.search(year_pattern, full_title)
+    title = match.group(1).strip() if match else query
+    year = match.group(2) if match else "0000"
+
+    tmdb_id_match = re.search(id_pattern, first_link)
+    tmdb_id = tmdb_id_match.group(1) if tmdb_id_match else "unknown"
+
+    return title, year, tmdb_id
+
+def _resolve_tmdb_api(query, content_type, api_key):
+    response = _http.get(f"https://api.themoviedb.org/3/search/{content_type}",
+                         params={"query": query, "api_key": api_key}, timeout=10)
+    response.raise_for_status()
+    results = response.json().get("results", [])
+    if not results:
+        return query, "0000", "unknown"
+
+    first = results[0]
+    if content_type == "tv":
+        title, date = first.get("name"), first.get("first_air_date")
+    else:
+        title, date = first.get("title"), first.get("release_date")
+    return title or query, (date or "0000")[:4], str(first["id"])
+
+def _scrape_tmdb_info(query, content_type="tv"):
+    with get_pool(headless=True).driver() as driver:
+        wait = WebDriverWait(driver, 10)
+        search_url = f"https://www.themoviedb.org/search/{content_type}?query={query.replace(' ', '+')}"
+        id_pattern, year_pattern = TMDB_PATTERNS[content_type]
+
+        with span('webdriver.get', 'webdriver', url=search_url):
+            driver.get(search_url)
 
         try:
-            if content_type == "tv":
-                cards = wait.until(ec.presence_of_all_elements_located((By.CSS_SELECTOR, "div.card a[href*='/tv/']")))
-            else:
-                cards = wait.until(ec.presence_of_all_elements_located((By.CSS_SELECTOR, "div.card a[href*='/movie/']")))
+            cards = wait.until(ec.presence_of_all_elements_located(
+                (By.CSS_SELECTOR, f"div.card a[href*='/{content_type}/']")))
         except TimeoutException:
             # No results found
-            print(f"[WARN] No TMDB results for query: {query}")
+            print(f"[WARN] No TMDB results for query: {query}", file=sys.stderr)
             return query, "0000", "unknown"
 
         # Extract the first result
         first_link = cards[0].get_attribute("href")
-        driver.get(first_link)
+        with span('webdriver.get', 'webdriver', url=first_link):
+            driver.get(first_link)
 
         WebDriverWait(driver, 10).until(lambda d: d.title != "")
 
@@ -54,47 +227,46 @@ def scrape_tmdb_info(query, content_type="tv"):
 
         return title, year, tmdb_id
 
-    except Exception as e:
-        print(f"[ERROR] TMDB scrape failed for '{query}': {e}")
-        return query, "0000", "unknown"
-
-    finally:
-        driver.quit()
 
-
-def scrape_drive_links(query):
-    options = webdriver.ChromeOptions()
-    options.add_argument("--window-size=1400,900")
-    driver = webdriver.Chrome(options=options)
-    wait = WebDriverWait(driver, 15)
+def scrape_drive_links(query, headless=False, retries=None, timeout=15):
+    """
+    Search kayoanime for `query`, open the first result and return its Drive links
+    as [text, href] pairs. All links are read in a single execute_script call, and the
+    page is waited on by condition instead of fixed sleeps. `retries` (default: the
+    scrape_retries setting) bounds how often a stale search result is clicked again.
+    """
+    if retries is None:
+        retries = get_int_setting(read_settings(), "scrape_retries", SCRAPE_RETRIES)
+    retries = max(1, retries)
     results = []
 
     try:
-        driver.get("https://kayoanime.com/")
-
-        search_box = wait.until(ec.element_to_be_clickable((By.CSS_SELECTOR, "input[name='s']")))
-        search_box.clear()
-        search_box.send_keys(query)
-        search_box.send_keys(Keys.RETURN)
-
-        for _ in range(3):
-            try:
-                first_result = wait.until(ec.presence_of_element_located((By.CSS_SELECTOR, ".post-title a")))
-                driver.execute_script("arguments[0].scrollIntoView(true);", first_result)
-                first_result.click()
-                break
-            except StaleElementReferenceException:
-                time.sleep(1)
-
-        time.sleep(3)
-
-        links = driver.find_elements(By.TAG_NAME, "a")
-        for link in links:
-            href = link.get_attribute("href")
-            if href and "drive.google.com" in href:
-                text = link.text.strip() or "(no text)"
-                results.append([text, href])
+        with span('scrape', query=query), get_pool(headless=headless).driver() as driver:
+            wait = WebDriverWait(driver, timeout)
+            with span('webdriver.get', 'webdriver', url="https://kayoanime.com/"):
+                driver.get("https://kayoanime.com/")
+
+            with span('webdriver.search', 'webdriver'):
+                search_box = wait.until(ec.element_to_be_clickable((By.CSS_SELECTOR, "input[name='s']")))
+                search_box.clear()
+                search_box.send_keys(query)
+                search_box.send_keys(Keys.RETURN)
+
+            for attempt in range(retries):
+                try:
+                    with span('webdriver.open_result', 'webdriver', attempt=attempt + 1):
+                        first_result = wait.until(ec.element_to_be_clickable((By.CSS_SELECTOR, ".post-title a")))
+                        driver.execute_script("arguments[0].scrollIntoView(true);", first_result)
+                        first_result.click()
+                        # The result page has loaded once the search page's link is gone
+                        wait.until(ec.staleness_of(first_result))
+                    break
+                except (StaleElementReferenceException, ElementClickInterceptedException):
+                    if attempt == retries - 1:
+                        raise
+
+            with span('webdriver.extract_links', 'webdriver'):
+                results = wait.until(lambda d: d.execute_script(DRIVE_LINKS_SCRIPT))["links"]
 
     finally:
-        driver.quit()
-        return results
\ No newline at end of file
+        return results